@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Numeric analysis of an expression in x: derivatives, root finding and integration.
+
+Each expression is parsed once. Derivatives come from forward-mode automatic
+differentiation: the postfix program is compiled into a Python function which computes
+the value and the derivative together, and only for the parts that depend on x.
+Compiled functions are cached, so solving the same expression again starts at once.
+
+Roots are found with Newton's method, falling back to bisection (kept within a bracket
+where the expression changes sign) when Newton's steps don't converge. Integrals use
+adaptive Gauss-Kronrod quadrature, which evaluates the points of every interval still
+being refined in one batch (with NumPy, if it is installed, in one vectorized call).
+
+    python CalculatorAnalysis.py solve "x^2-2" --guess 1
+    python CalculatorAnalysis.py integrate "sx)" 0 3.14159
+"""
+
+import math as m
+import sys
+from CalculatorEngine import Evaluate, ProgramCache, operators, free_variables
+
+"""Compiled value and derivative functions, keyed by infix expression."""
+dual_cache = ProgramCache()
+
+"""Templates of the value, and of the derivative (given the operands' derivatives {2} and {3}), of each operator."""
+# {0} and {1} are the operands, {v} is the value; derivatives of operands that don't depend on x are left out
+dual_templates = {'+': ('{0} + {1}', '{2} + {3}', '{2}', '{3}'),
+                  '-': ('{0} - {1}', '{2} - {3}', '{2}', '-{3}'),
+                  '*': ('{0} * {1}', '{0} * {3} + {2} * {1}', '{2} * {1}', '{0} * {3}'),
+                  '/': ('{0} / {1}', '({2} * {1} - {0} * {3}) / ({1} * {1})', '{2} / {1}', '-{0} * {3} / ({1} * {1})'),
+                  '^': ('{0} ** {1}', '{v} * ({3} * _log({0}) + {1} * {2} / {0})', '{1} * {0} ** ({1} - 1) * {2}',
+                        '{v} * {3} * _log({0})'),
+                  '~': ('-{0}', '-{2}'),
+                  's': ('_sin({0})', '_cos({0}) * {2}'),
+                  'c': ('_cos({0})', '-_sin({0}) * {2}'),
+                  't': ('_tan({0})', '{2} / _cos({0}) ** 2'),
+                  'g': ('_cot({0})', '-{2} / _sin({0}) ** 2'),
+                  'l': ('_log10({0})', '{2} / ({0} * _ln10)'),
+                  'n': ('_log({0})', '{2} / {0}'),
+                  'q': ('_sqrt({0})', '{2} / (2 * {v})')
+                 }
+
+"""Gauss-Kronrod 7-15 rule: the Kronrod nodes on [-1, 1] (the odd ones are the Gauss nodes), and both weights."""
+kronrod_nodes = (-0.991455371120812639206854697526329, -0.949107912342758524526189684047851,
+                 -0.864864423359769072789712788640926, -0.741531185599394439863864773280788,
+                 -0.586087235467691130294144845693013, -0.405845151377397166906606412076961,
+                 -0.207784955007898467600689403773245, 0.0,
+                 0.207784955007898467600689403773245, 0.405845151377397166906606412076961,
+                 0.586087235467691130294144845693013, 0.741531185599394439863864773280788,
+                 0.864864423359769072789712788640926, 0.949107912342758524526189684047851,
+                 0.991455371120812639206854697526329)
+kronrod_weights = (0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                   0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                   0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                   0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+                   0.204432940075298892414161999234649, 0.190350578064785409913256402421014,
+                   0.169004726639267902826583426598550, 0.140653259715525918745189590510238,
+                   0.104790010322250183839876322541518, 0.063092092629978553290700663189204,
+                   0.022935322010529224963732008058970)
+gauss_weights = (0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+                 0.381830050505118944950369775488975, 0.417959183673469387755102040816327,
+                 0.381830050505118944950369775488975, 0.279705391489276667901467771423780,
+                 0.129484966168869693270611432679082)
+
+def compile_dual(postfix_expression):
+    """
+    Compiles a postfix expression in x into a function computing its value and derivative (forward mode).
+
+        Parameters:
+            postfix_expression (Stack): the mathematical expression in postfix notation
+                                        contained in a Stack structure
+
+        Returns:
+            dual (function): takes x (float), returns the (value, derivative) tuple,
+                             and raises ArithmeticError or ValueError where either is undefined
+    """
+
+    namespace = {'_sin': m.sin, '_cos': m.cos, '_tan': m.tan, '_log10': m.log10, '_log': m.log,
+                 '_sqrt': m.sqrt, '_cot': operators['g'].func, '_ln10': m.log(10)}
+    lines = ['def _dual(x):']
+
+    # a (value name, derivative name) tuple for each operand, where the derivative
+    # name is None if the operand doesn't depend on x
+    operand_stack = []
+
+    for symbol in postfix_expression.array:
+
+        if type(symbol) != str:
+            name = f'_k{len(namespace)}'
+            namespace[name] = float(symbol)
+            operand_stack.append((name, None))
+            continue
+
+        if symbol in free_variables:
+            operand_stack.append(('x', '1.0'))
+            continue
+
+        if symbol not in operators:
+            raise Exception("invalid operator: postfix evaluation")
+
+        if symbol == '(' or symbol == ')':
+            continue
+
+        value = f'_v{len(lines)}'
+        derivative = f'_d{len(lines)}'
+        templates = dual_templates[symbol]
+
+        if operators[symbol].is_unary:
+            if not operand_stack:
+                raise Exception("postfix evaluation exception: missing operand")
+            x, dx = operand_stack.pop()
+            lines.append(f'    {value} = ' + templates[0].format(x))
+            if dx is not None:
+                lines.append(f'    {derivative} = ' + templates[1].format(x, None, dx, v=value))
+
+        else:
+            if len(operand_stack) < 2:
+                raise Exception("postfix evaluation exception: missing operand")
+            y, dy = operand_stack.pop()
+            x, dx = operand_stack.pop()
+            lines.append(f'    {value} = ' + templates[0].format(x, y))
+            # the product rule etc. without the terms whose derivative is zero
+            if dx is not None and dy is not None:
+                lines.append(f'    {derivative} = ' + templates[1].format(x, y, dx, dy, v=value))
+            elif dx is not None:
+                lines.append(f'    {derivative} = ' + templates[2].format(x, y, dx, dy, v=value))
+            elif dy is not None:
+                lines.append(f'    {derivative} = ' + templates[3].format(x, y, dx, dy, v=value))
+
+            # the result depends on x if either operand does
+            dx = dx if dx is not None else dy
+
+        operand_stack.append((value, derivative if dx is not None else None))
+
+    if len(operand_stack) != 1:
+        raise Exception("postfix evaluation exception: operands remaining")
+
+    value, derivative = operand_stack[0]
+    lines.append(f'    return {value}, {derivative or "0.0"}')
+
+    exec('\n'.join(lines), namespace)
+    return namespace['_dual']
+
+def dual_function(infix_expression):
+    """
+    Returns the value and derivative function of an infix expression in x, compiling it only once.
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation
+
+        Returns:
+            dual (function): takes x (float), returns the (value, derivative) tuple of floats,
+                             or None where the expression is undefined (errors and complex results)
+    """
+
+    dual = dual_cache.get(infix_expression)
+    if dual is not None:
+        return dual
+
+    compiled = compile_dual(Evaluate.convert_to_postfix(infix_expression))
+
+    def dual(x):
+        try:
+            value, derivative = compiled(x)
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+        # negative numbers to fractional powers are complex
+        if type(value) == complex or type(derivative) == complex:
+            return None
+        return float(value), float(derivative)
+
+    dual_cache.put(infix_expression, dual)
+    return dual
+
+def derivative(infix_expression, x):
+    """
+    Returns the derivative of an expression at a point (None if it is undefined there).
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation, in x
+            x (float): the point
+    """
+
+    result = dual_function(infix_expression)(float(x))
+    return None if result is None else result[1]
+
+def newton(dual, guess, tolerance, max_iterations):
+    """
+    Looks for a root with Newton's method alone.
+
+        Parameters:
+            dual (function): the value and derivative function (see dual_function)
+            guess (float): the starting point
+            tolerance (float): the step size, relative to max(1, |x|), counted as converged
+            max_iterations (int): the most steps
+
+        Returns:
+            root (float): the root, or None if the steps didn't converge to one
+    """
+
+    x = guess
+    for _ in range(max_iterations):
+        result = dual(x)
+        if result is None:
+            return None
+        y, dy = result
+        if y == 0:
+            return x
+        if dy == 0 or not m.isfinite(dy) or not m.isfinite(y):
+            return None
+        step = y / dy
+        x -= step
+        if not m.isfinite(x):
+            return None
+        if abs(step) <= tolerance * max(1.0, abs(x)):
+            # converging on a pole (such as TAN's) also takes tiny steps
+            result = dual(x)
+            if result is None or abs(result[0]) > abs(y) * 2 + tolerance:
+                return None
+            return x
+    return None
+
+def find_bracket(dual, guess, max_steps=60):
+    """
+    Looks outward from a point, on both sides, for an interval where an expression changes sign.
+
+        Parameters:
+            dual (function): the value and derivative function (see dual_function)
+            guess (float): the point to start from
+            max_steps (int): the most steps on each side (each 1.5 times the last)
+
+        Returns:
+            bracket (tuple): the (low, high) interval nearest the guess, or None if none was found
+    """
+
+    start = dual(guess)
+    step = 0.01 * max(1.0, abs(guess))
+    previous = {1: (guess, start), -1: (guess, start)}
+
+    for _ in range(max_steps):
+        for side in (1, -1):
+            x0, result0 = previous[side]
+            x1 = x0 + side * step
+            result1 = dual(x1)
+            if result0 is not None and result1 is not None and (result0[0] < 0) != (result1[0] < 0):
+                return (min(x0, x1), max(x0, x1))
+            previous[side] = (x1, result1)
+        step *= 1.5
+    return None
+
+def bisect_newton(dual, low, high, tolerance, max_iterations):
+    """
+    Finds a root in an interval where an expression changes sign, taking Newton steps
+    when they stay inside the interval and shrink it fast enough, otherwise bisecting.
+
+        Parameters:
+            dual (function): the value and derivative function (see dual_function)
+            low (float): the start of the interval
+            high (float): the end of the interval
+            tolerance (float): the interval width, relative to max(1, |x|), counted as converged
+            max_iterations (int): the most steps
+
+        Returns:
+            root (float): the root (or sign change, at a discontinuity)
+    """
+
+    # orient the interval so the expression is negative at low
+    start = dual(low)
+    if start is not None and start[0] > 0:
+        low, high = high, low
+
+    x = (low + high) / 2
+    last_step = abs(high - low)
+    for _ in range(max_iterations):
+        result = dual(x)
+        if result is None:
+            # undefined inside the interval: bisect towards the defined end
+            high = x
+            x = (low + high) / 2
+            continue
+
+        y, dy = result
+        if y == 0:
+            return x
+        if y < 0:
+            low = x
+        else:
+            high = x
+
+        # take the Newton step only if it lands inside the interval and halves the step before last
+        newton_x = x - y / dy if dy != 0 and m.isfinite(dy) else None
+        if newton_x is not None and min(low, high) < newton_x < max(low, high) and abs(y / dy) * 2 < last_step:
+            last_step = abs(y / dy)
+            x = newton_x
+        else:
+            last_step = abs(high - low) / 2
+            x = (low + high) / 2
+
+        if last_step <= tolerance * max(1.0, abs(x)):
+            return x
+    return x
+
+def solve(infix_expression, guess=0.0, low=None, high=None, tolerance=1e-12, max_iterations=100):
+    """
+    Finds a root of an expression in x: a value of x where it is zero.
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation, in x
+            guess (float): the starting point (ignored if low and high are given)
+            low (float): the start of an interval where the expression changes sign (optional)
+            high (float): the end of that interval (optional)
+            tolerance (float): the precision of the root, relative to max(1, |root|)
+            max_iterations (int): the most Newton (or bisection) steps
+
+        Returns:
+            root (float): the root nearest the guess (or inside the interval)
+    """
+
+    dual = dual_function(infix_expression)
+
+    if low is None or high is None:
+        root = newton(dual, float(guess), tolerance, max_iterations)
+        if root is not None:
+            return root
+        bracket = find_bracket(dual, float(guess))
+        if bracket is None:
+            raise Exception("no sign change found near the guess: no root")
+        low, high = bracket
+    else:
+        low, high = float(low), float(high)
+        ends = dual(low), dual(high)
+        if None in ends or (ends[0][0] < 0) == (ends[1][0] < 0):
+            if ends[0] is not None and ends[0][0] == 0:
+                return low
+            if ends[1] is not None and ends[1][0] == 0:
+                return high
+            raise Exception("the expression must change sign between low and high")
+
+    # halving the interval takes about 60 steps to reach double precision, whatever was asked
+    root = bisect_newton(dual, low, high, tolerance, max(max_iterations, 200))
+
+    # a sign change without a root is a discontinuity, such as TAN's pole,
+    # where the expression is further from zero than at either end of the interval
+    result = dual(root)
+    ends = min(abs(dual(low)[0]), abs(dual(high)[0]))
+    if result is None or not m.isfinite(result[0]) or abs(result[0]) >= ends:
+        raise Exception(f"the expression changes sign at x={root:.17g} without a root (a discontinuity)")
+    return root
+
+def evaluate_points(infix_expression, points):
+    """
+    Evaluates an expression in x at many points in one batch.
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation, in x
+            points (list of float): the values of x
+
+        Returns:
+            values (list of float): the value at each point (NaN where it is undefined)
+    """
+
+    postfix = Evaluate.convert_to_postfix(infix_expression)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        return Evaluate.evaluate_array(postfix, {'x': np.asarray(points, dtype=float)}).tolist()
+
+    # without NumPy, the compiled function still skips parsing and interpreting each point
+    program = Evaluate.compile_expression(infix_expression)
+    values = []
+    variables = {'x': 0.0}
+    for x in points:
+        variables['x'] = x
+        try:
+            value = program(variables)
+        except (ArithmeticError, ValueError, TypeError):
+            value = m.nan
+        values.append(float(value) if type(value) in (int, float) else m.nan)
+    return values
+
+def integrate(infix_expression, low, high, tolerance=1e-10, max_intervals=10000, initial=8):
+    """
+    Integrates an expression in x over an interval, with adaptive Gauss-Kronrod (7-15) quadrature.
+    Every round evaluates the points of all the intervals still being refined in one batch.
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation, in x
+            low (float): the start of the interval
+            high (float): the end of the interval
+            tolerance (float): the absolute error wanted
+            max_intervals (int): the most intervals evaluated in all
+            initial (int): the number of equal intervals to start with
+
+        Returns:
+            integral (float): the estimated integral
+            error (float): the estimated absolute error
+    """
+
+    low, high = float(low), float(high)
+    if low == high:
+        return 0.0, 0.0
+    sign = 1.0
+    if low > high:
+        low, high, sign = high, low, -1.0
+
+    width = high - low
+    intervals = [(low + width * i / initial, low + width * (i + 1) / initial) for i in range(initial)]
+    integral = 0.0
+    error = 0.0
+    evaluated = 0
+
+    while intervals:
+        points = [(a + b) / 2 + (b - a) / 2 * node for a, b in intervals for node in kronrod_nodes]
+        values = evaluate_points(infix_expression, points)
+        evaluated += len(intervals)
+
+        refine = []
+        for index, (a, b) in enumerate(intervals):
+            f = values[index * 15:(index + 1) * 15]
+            if not all(m.isfinite(value) for value in f):
+                bad = next(x for x, value in zip(points[index * 15:], f) if not m.isfinite(value))
+                raise Exception(f"the expression is undefined or infinite at x={bad:.17g}")
+
+            half = (b - a) / 2
+            kronrod = half * sum(w * value for w, value in zip(kronrod_weights, f))
+            gauss = half * sum(w * value for w, value in zip(gauss_weights, f[1::2]))
+            estimate = abs(kronrod - gauss)
+
+            # each interval may have its share of the error; stop splitting intervals too small to split
+            too_small = a + half == a or a + half == b
+            if estimate <= tolerance * (b - a) / width or too_small or evaluated + len(refine) * 2 > max_intervals:
+                integral += kronrod
+                error += estimate
+            else:
+                refine.append((a, b))
+
+        intervals = [piece for a, b in refine for piece in ((a, (a + b) / 2), ((a + b) / 2, b))]
+
+    return sign * integral, error
+
+def main(argv=None):
+    """The main method. Solves or integrates an expression from the command line."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find roots and integrals of an expression in x "
+                                                 "(internal expression strings, e.g. 'sx)' for SIN(x)).")
+    commands = parser.add_subparsers(dest='command', required=True)
+    solve_parser = commands.add_parser('solve', help="find a root")
+    solve_parser.add_argument('expression')
+    solve_parser.add_argument('--guess', type=float, default=0.0)
+    solve_parser.add_argument('--low', type=float, default=None, help="start of an interval with a sign change")
+    solve_parser.add_argument('--high', type=float, default=None, help="end of that interval")
+    solve_parser.add_argument('--tolerance', type=float, default=1e-12)
+    integrate_parser = commands.add_parser('integrate', help="integrate over an interval")
+    integrate_parser.add_argument('expression')
+    integrate_parser.add_argument('low', type=float)
+    integrate_parser.add_argument('high', type=float)
+    integrate_parser.add_argument('--tolerance', type=float, default=1e-10)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'solve':
+            print(repr(solve(args.expression, args.guess, args.low, args.high, args.tolerance)))
+        else:
+            integral, error = integrate(args.expression, args.low, args.high, args.tolerance)
+            print(f"{integral!r} (error {error:.3g})")
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+A reproducible benchmark of the calculator's parse, evaluate, to_string and GUI paths.
+
+Synthetic expressions are generated from a seed, with a controlled length (number of
+operands), nesting depth and operator mix. Each stage is timed separately and reported
+as throughput and latency percentiles, for each expression size, so that scaling can be
+seen as well as speed. Results can be written as JSON and compared with a saved baseline:
+
+    python CalculatorBenchmark.py --sizes 8,64,512 --json baseline.json
+    python CalculatorBenchmark.py --sizes 8,64,512 --compare baseline.json
+"""
+
+import json
+import math as m
+import platform
+import queue
+import random
+import sys
+import time
+from itertools import count
+from CalculatorEngine import Evaluate
+
+"""The stages that can be timed."""
+stages = ('parse', 'evaluate', 'to_string', 'gui')
+
+"""The default operator mix: the relative weight of each operator in generated expressions."""
+default_mix = {'+': 4, '-': 4, '*': 3, '/': 2, '^': 1, 's': 1, 'c': 1, 't': 1, 'l': 1, 'n': 1, 'q': 1, '(': 2}
+
+def generate_expression(rng, operands, depth, mix):
+    """
+    Generates a random internal expression string.
+
+        Parameters:
+            rng (random.Random): the random number generator
+            operands (int): the number of operands in the expression
+            depth (int): the greatest nesting of parentheses and functions
+            mix (dict): the relative weight of each operator ('(' for plain parentheses)
+
+        Returns:
+            expression (str): the expression
+    """
+
+    binary = [symbol for symbol in mix if symbol in ('+', '-', '*', '/', '^')]
+    binary_weights = [mix[symbol] for symbol in binary]
+    wrappers = [symbol for symbol in mix if symbol not in binary]
+    wrapper_weights = [mix[symbol] for symbol in wrappers]
+
+    def number():
+        digits = str(rng.randint(1, 999))
+        return digits + '.' + str(rng.randint(0, 99)) if rng.random() < 0.3 else digits
+
+    def build(operands, depth):
+        # wrap in parentheses or a function now and then, while nesting is allowed
+        if depth > 0 and wrappers and rng.random() < 0.3:
+            return rng.choices(wrappers, wrapper_weights)[0] + build(operands, depth - 1) + ')'
+        if operands == 1:
+            return number()
+        symbol = rng.choices(binary, binary_weights)[0]
+        # keep exponents small, so most powers don't overflow
+        if symbol == '^':
+            return build(operands - 1, depth) + '^' + str(rng.randint(0, 3))
+        left = operands // 2
+        return build(left, depth) + symbol + build(operands - left, depth)
+
+    return build(operands, depth)
+
+def generate_corpus(count, operands, depth, mix=default_mix, seed=0):
+    """
+    Generates a list of random internal expression strings (the same for the same arguments).
+
+        Parameters:
+            count (int): the number of expressions
+            operands (int): the number of operands in each expression
+            depth (int): the greatest nesting of parentheses and functions
+            mix (dict): the relative weight of each operator
+            seed (int): the random seed
+
+        Returns:
+            corpus (list of str): the expressions
+    """
+
+    rng = random.Random(f"{seed}:{operands}:{depth}")
+    return [generate_expression(rng, operands, depth, mix) for _ in range(count)]
+
+class HeadlessWidget:
+    """A class which stands in for the GUI's Tk widgets, so its commands can be timed without a display.
+       Scheduled callbacks are kept and run when run_pending is called."""
+
+    def __init__(self):
+        self.text = ''
+        self.callbacks = {}
+        # ids are never reused, so a cancelled one can't stand for a later callback
+        self.identifiers = count(1)
+
+    def config(self, **options):
+        self.text = options.get('text', self.text)
+
+    def insert(self, index, text):
+        self.text = self.text + text if index == 'end' else self.text[:index] + text + self.text[index:]
+
+    def delete(self, first, last=None):
+        last = len(self.text) if last == 'end' else (first + 1 if last is None else last)
+        if first >= last:
+            return
+        self.text = self.text[:first] + self.text[last:]
+
+    def get(self):
+        return self.text
+
+    def index(self, index):
+        return len(self.text) if index == 'end' else index
+
+    def after(self, delay, callback):
+        identifier = next(self.identifiers)
+        self.callbacks[identifier] = callback
+        return identifier
+
+    after_idle = lambda self, callback: self.after(0, callback)
+
+    def after_cancel(self, identifier):
+        self.callbacks.pop(identifier, None)
+
+    def run_pending(self):
+        """Runs the scheduled callbacks, as the Tk event loop would once it is idle."""
+        while self.callbacks:
+            self.callbacks.pop(next(iter(self.callbacks)))()
+            # let the GUI's threads run, as they would while Tk waits for a callback's delay
+            time.sleep(0)
+
+def headless_gui():
+    """
+    Creates a GUI whose widgets are HeadlessWidgets.
+
+        Returns:
+            gui (GUI): the calculator, ready for its button commands to be called
+    """
+
+    from CalculatorGUI import GUI
+
+    gui = GUI.__new__(GUI)
+    gui.create_state()
+    gui.root = HeadlessWidget()
+    gui.terminal = HeadlessWidget()
+    gui.preview = HeadlessWidget()
+    gui.cancel_button = HeadlessWidget()
+    return gui
+
+def press_keys(gui, expression):
+    """
+    Types an expression into the GUI, then presses enter and clear.
+
+        Parameters:
+            gui (GUI): the calculator (see headless_gui)
+            expression (str): the internal expression string to type
+    """
+
+    for symbol in expression:
+        if symbol.isdigit():
+            gui.number_command(symbol)
+        else:
+            gui.operator_command(symbol)
+    # evaluate the preview now rather than after its delay, and wait for the preview thread
+    # (blocking, so the GIL is free for it) before the GUI polls for it
+    if gui.pending_preview is not None:
+        gui.root.after_cancel(gui.pending_preview)
+        gui.update_preview()
+    while gui.preview_waiting:
+        try:
+            number, result, seconds = gui.preview_results.get(timeout=gui.poll_interval / 1000)
+        except queue.Empty:
+            gui.start_preview_thread()
+            continue
+        if number == gui.preview_job:
+            gui.preview_results.put((number, result, seconds))
+            break
+    gui.root.run_pending()
+    gui.enter_command()
+    # wait for the worker thread's result (blocking, so the GIL is free for it), then let the GUI poll
+    if gui.job is not None:
+        gui.results.put(gui.results.get())
+    gui.root.run_pending()
+    gui.clear_command()
+
+def time_stage(stage, corpus):
+    """
+    Times one stage for each expression of a corpus.
+
+        Parameters:
+            stage (str): one of stages
+            corpus (list of str): the expressions
+
+        Returns:
+            latencies (list of float): the time taken for each expression, in seconds
+    """
+
+    clock = time.perf_counter
+    latencies = []
+
+    if stage == 'parse':
+        for expression in corpus:
+            start = clock()
+            Evaluate.parse(expression)
+            latencies.append(clock() - start)
+
+    elif stage == 'evaluate':
+        for postfix in [Evaluate.parse(expression) for expression in corpus]:
+            start = clock()
+            Evaluate.evaluate(postfix)
+            latencies.append(clock() - start)
+
+    elif stage == 'to_string':
+        for expression in corpus:
+            start = clock()
+            Evaluate.to_string(expression)
+            latencies.append(clock() - start)
+
+    elif stage == 'gui':
+        gui = headless_gui()
+        for expression in corpus:
+            start = clock()
+            press_keys(gui, expression)
+            latencies.append(clock() - start)
+
+    else:
+        raise Exception(f"unknown stage: {stage}")
+
+    return latencies
+
+def percentile(ordered, fraction):
+    """Returns a percentile of a sorted list (nearest rank)."""
+    return ordered[min(len(ordered) - 1, max(0, m.ceil(fraction * len(ordered)) - 1))]
+
+def summarize(latencies, characters):
+    """
+    Summarizes the latencies of one stage.
+
+        Parameters:
+            latencies (list of float): the time taken for each expression, in seconds
+            characters (int): the total length of the expressions
+
+        Returns:
+            summary (dict): throughput (expressions and characters per second)
+                            and latency percentiles (in microseconds)
+    """
+
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {'expressions_per_second': len(ordered) / total if total else float('inf'),
+            'characters_per_second': characters / total if total else float('inf'),
+            'p50_us': percentile(ordered, 0.50) * 1e6,
+            'p90_us': percentile(ordered, 0.90) * 1e6,
+            'p99_us': percentile(ordered, 0.99) * 1e6,
+            'max_us': ordered[-1] * 1e6}
+
+def run_benchmark(sizes=(8, 64, 512), count=200, depth=3, mix=default_mix, seed=0, selected=stages, repeat=3):
+    """
+    Runs the benchmark for each expression size.
+
+        Parameters:
+            sizes (tuple of int): the numbers of operands per expression
+            count (int): the number of expressions of each size
+            depth (int): the greatest nesting of parentheses and functions
+            mix (dict): the relative weight of each operator
+            seed (int): the random seed
+            selected (tuple of str): the stages to time
+            repeat (int): the number of times each stage is timed (the fastest run is kept)
+
+        Returns:
+            report (dict): the settings, the machine, and a summary for each stage and size,
+                           with the scaling exponent of each stage between consecutive sizes
+    """
+
+    report = {'settings': {'sizes': list(sizes), 'count': count, 'depth': depth, 'mix': mix,
+                           'seed': seed, 'repeat': repeat},
+              'machine': {'python': sys.version.split()[0], 'implementation': platform.python_implementation(),
+                          'platform': platform.platform()},
+              'results': {}}
+
+    for stage in selected:
+        per_size = {}
+        for size in sizes:
+            corpus = generate_corpus(count, size, depth, mix, seed)
+            characters = sum(len(expression) for expression in corpus)
+            runs = [time_stage(stage, corpus) for _ in range(repeat)]
+            per_size[str(size)] = summarize(min(runs, key=sum), characters)
+            per_size[str(size)]['mean_length'] = characters / count
+
+        # how time per expression grows with size: 1 is linear, 2 is quadratic
+        for smaller, larger in zip(sizes, sizes[1:]):
+            a, b = per_size[str(smaller)], per_size[str(larger)]
+            ratio = a['expressions_per_second'] / b['expressions_per_second']
+            growth = b['mean_length'] / a['mean_length']
+            b['scaling_exponent'] = m.log(ratio) / m.log(growth) if growth > 1 and ratio > 0 else None
+
+        report['results'][stage] = per_size
+
+    return report
+
+def compare(report, baseline, threshold=0.10):
+    """
+    Compares the throughput of a report with a baseline report.
+
+        Parameters:
+            report (dict): the new report (see run_benchmark)
+            baseline (dict): the saved report
+            threshold (float): the fractional slowdown counted as a regression
+
+        Returns:
+            regressions (list of str): a description of each stage and size that got slower
+    """
+
+    regressions = []
+    for stage, per_size in report['results'].items():
+        for size, summary in per_size.items():
+            old = baseline.get('results', {}).get(stage, {}).get(size)
+            if old is None:
+                continue
+            change = summary['expressions_per_second'] / old['expressions_per_second'] - 1
+            if change < -threshold:
+                regressions.append(f"{stage} (size {size}): {old['expressions_per_second']:.0f} -> "
+                                   f"{summary['expressions_per_second']:.0f} expressions/s ({change:+.0%})")
+    return regressions
+
+def print_report(report, output=sys.stdout):
+    """Prints a report as a table."""
+
+    output.write(f"{'stage':<10} {'size':>6} {'expr/s':>12} {'chars/s':>12} {'p50 us':>10} "
+                 f"{'p90 us':>10} {'p99 us':>10} {'scaling':>8}\n")
+    for stage, per_size in report['results'].items():
+        for size, summary in per_size.items():
+            scaling = summary.get('scaling_exponent')
+            output.write(f"{stage:<10} {size:>6} {summary['expressions_per_second']:>12.0f} "
+                         f"{summary['characters_per_second']:>12.0f} {summary['p50_us']:>10.1f} "
+                         f"{summary['p90_us']:>10.1f} {summary['p99_us']:>10.1f} "
+                         f"{'' if scaling is None else f'{scaling:.2f}':>8}\n")
+
+def main(argv=None):
+    """The main method. Runs the benchmark from the command line."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the calculator engine and GUI commands.")
+    parser.add_argument('--sizes', default='8,64,512', help="operands per expression, comma separated")
+    parser.add_argument('--count', type=int, default=200, help="expressions of each size")
+    parser.add_argument('--depth', type=int, default=3, help="greatest nesting of parentheses and functions")
+    parser.add_argument('--mix', default=None, help="operator weights as JSON, e.g. '{\"+\": 1, \"s\": 2}'")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage (the fastest is kept)")
+    parser.add_argument('--stages', default=','.join(stages), help="stages to time, comma separated")
+    parser.add_argument('--json', metavar='PATH', help="write the report as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a saved JSON report")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    selected = tuple(args.stages.split(','))
+    report = run_benchmark(tuple(int(size) for size in args.sizes.split(',')), args.count, args.depth,
+                           json.loads(args.mix) if args.mix else default_mix, args.seed, selected, args.repeat)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print("regression:", regression)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
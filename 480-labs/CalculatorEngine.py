@@ -0,0 +1,1774 @@
+# -*- coding: utf-8 -*-
+"""
+The evaluation engine of the calculator: operators, conversion to postfix and evaluation.
+
+It does not use tkinter (see CalculatorGUI), and keeps its own imports to the
+standard library modules it needs at startup, so worker processes and the
+command line mode can import it quickly on any host.
+"""
+
+import math as m
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from operator import add, sub, mul, truediv, neg
+
+class Operator:
+    """A class which keeps track of information about different operators."""
+    
+    def __init__(self, symbol, priority, is_unary, output_string, button_string, func):
+        self.symbol = symbol
+        self.priority = priority
+        self.is_unary = is_unary
+        self.output_str = output_string
+        self.button_str = button_string
+        self.func = func
+
+class Stack:
+    """A class which adapts a list into a Stack structure."""
+    
+    # Constructor
+    def __init__(self):
+        self.top = -1
+        self.array = []
+        
+    # check if stack is empty
+    def isEmpty(self):
+        return True if self.top == -1 else False
+    
+    # return top of stack
+    def peek(self):
+        return self.array[-1]
+    
+    # pop top of stack (returns ? if empty)
+    def pop(self):
+        if not self.isEmpty():
+            self.top -= 1
+            return self.array.pop()
+        else:
+            return "?"
+        
+    # push element to stack
+    def push(self, element):
+        self.top += 1
+        self.array.append(element)
+
+class ProgramCache:
+    """A class which keeps recently parsed programs, evicting the least recently used.
+       It is safe to share between threads."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached program for a key, or None if it is not cached.
+
+            Parameters:
+                key (str): the internal expression string
+
+            Returns:
+                program: the cached program (or None on a miss)
+        """
+
+        with self._lock:
+            program = self._entries.get(key)
+            if program is None:
+                self.misses += 1
+                return None
+            # mark as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return program
+
+    def put(self, key, program):
+        """
+        Stores a program, evicting the least recently used entries if the cache is full.
+
+            Parameters:
+                key (str): the internal expression string
+                program: the parsed program to keep
+        """
+
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = program
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        Removes one program from the cache, or every program if no key is given.
+
+            Parameters:
+                key (str): the internal expression string to forget (optional)
+        """
+
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def resize(self, maxsize):
+        """
+        Changes the number of programs the cache may hold (0 disables caching).
+
+            Parameters:
+                maxsize (int): the new maximum number of entries
+        """
+
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns a dictionary of the cache counters."""
+
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+class Program:
+    """A class which holds a postfix program in a compact form: one opcode byte per token,
+       a pool of the constants in order of use, and the variable names in order of use."""
+
+    __slots__ = ('opcodes', 'constants', 'names', 'max_depth', 'well_formed', 'mode')
+
+    def __init__(self, opcodes, constants, names, max_depth, well_formed=True, mode='float'):
+        self.opcodes = opcodes
+        self.constants = constants
+        self.names = names
+        self.max_depth = max_depth
+        self.well_formed = well_formed
+        self.mode = mode
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    @staticmethod
+    def from_postfix(postfix_expression, mode='float'):
+        """
+        Assembles a postfix stack into a program.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                mode (str): the numeric mode the expression was parsed in (see numeric_modes)
+
+            Returns:
+                program (Program): the same expression in compact form
+        """
+
+        program_opcodes = array('B')
+        names = []
+
+        # exact constants (ints and fractions) don't fit in an array of doubles
+        constants = array('d') if mode == 'float' else []
+
+        # track the operand stack depth, so the VM can preallocate it
+        depth = 0
+        max_depth = 0
+        well_formed = True
+
+        for symbol in postfix_expression.array:
+            if type(symbol) != str:
+                program_opcodes.append(CONSTANT)
+                constants.append(symbol)
+                depth += 1
+            elif symbol in free_variables or symbol[0] == '[':
+                program_opcodes.append(VARIABLE)
+                names.append(symbol[1:-1] if symbol[0] == '[' else symbol)
+                depth += 1
+            elif symbol not in opcodes:
+                raise Exception("invalid operator: postfix evaluation")
+            else:
+                program_opcodes.append(opcodes[symbol])
+                arity = dispatch_table[opcodes[symbol]][0]
+                if depth < arity:
+                    well_formed = False
+                depth = max(depth - arity + 1, 1) if arity else depth
+            max_depth = max(depth, max_depth)
+
+        # the result should be the one remaining operand
+        if depth != 1:
+            well_formed = False
+
+        return Program(program_opcodes, constants, tuple(names), max_depth, well_formed, mode)
+
+    def to_postfix(self):
+        """
+        Disassembles the program back into a postfix stack.
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        constants = iter(self.constants)
+        names = iter(self.names)
+
+        postfix_stack = Stack()
+        for opcode in self.opcodes:
+            if opcode == CONSTANT:
+                postfix_stack.push(next(constants))
+            elif opcode == VARIABLE:
+                name = next(names)
+                postfix_stack.push(name if name in free_variables else f'[{name}]')
+            else:
+                postfix_stack.push(opcode_symbols[opcode])
+        return postfix_stack
+
+class Metrics:
+    """A class which counts where the engine spends its time: a timer for each stage,
+       a counter for each operator evaluated, the deepest operand stack and each kind of error.
+       While disabled, Evaluate is left untouched, so it costs nothing; enabling it
+       swaps the timed Evaluate methods for instrumented wrappers."""
+
+    """The stages timed."""
+    stages = ('parse', 'evaluate', 'run', 'to_string')
+
+    """The Evaluate methods wrapped, and the stage each is timed in (bytes are parsed by parse_bytes)."""
+    timed_methods = {'parse': 'parse', 'parse_bytes': 'parse', 'evaluate': 'evaluate',
+                     'run': 'run', 'to_string': 'to_string'}
+
+    def __init__(self):
+        self.enabled = False
+        self._originals = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Sets every timer and counter back to zero."""
+
+        with self._lock:
+            self.calls = dict.fromkeys(Metrics.stages, 0)
+            self.seconds = dict.fromkeys(Metrics.stages, 0.0)
+            self.operators = dict.fromkeys(operators, 0)
+            self.errors = {'domain': 0, 'div_by_zero': 0, 'overflow': 0, 'invalid': 0}
+            self.max_depth = 0
+
+    def snapshot(self):
+        """Returns a copy of every timer and counter, as a dictionary."""
+
+        with self._lock:
+            return {'enabled': self.enabled,
+                    'stages': {stage: {'calls': self.calls[stage], 'seconds': self.seconds[stage]}
+                               for stage in Metrics.stages},
+                    'operators': dict(self.operators),
+                    'max_depth': self.max_depth,
+                    'errors': dict(self.errors)}
+
+    def enable(self):
+        """Starts recording, by replacing the timed Evaluate methods with instrumented ones."""
+
+        if self.enabled:
+            return
+        for name, stage in Metrics.timed_methods.items():
+            self._originals[name] = Evaluate.__dict__[name]
+            setattr(Evaluate, name, staticmethod(self._instrument(stage, self._originals[name].__func__)))
+        self.enabled = True
+
+    def disable(self):
+        """Stops recording, putting back the original Evaluate methods (the counts are kept)."""
+
+        if not self.enabled:
+            return
+        for name, method in self._originals.items():
+            setattr(Evaluate, name, method)
+        self._originals = {}
+        self.enabled = False
+
+    def _instrument(self, stage, func):
+        """Returns func wrapped to time it and to count what it evaluates."""
+
+        clock = time.perf_counter
+        counted = stage in ('evaluate', 'run')
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                if counted:
+                    self.record_error(INVALID)
+                raise
+            finally:
+                elapsed = clock() - start
+                with self._lock:
+                    self.calls[stage] += 1
+                    self.seconds[stage] += elapsed
+            if counted:
+                self.record_program(stage, args[0], result)
+            return result
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def record_program(self, stage, program, result):
+        """
+        Counts the operators and stack depth of an evaluated program, and the error it gave.
+
+            Parameters:
+                stage (str): 'evaluate' (program is a postfix Stack) or 'run' (program is a Program)
+                program (Stack or Program): the program that was evaluated
+                result (float, int or str): its result, or error message
+        """
+
+        # malformed programs are run by Evaluate.evaluate, which counts them itself
+        if stage == 'run' and not program.well_formed:
+            return
+
+        if stage == 'run':
+            symbols = [opcode_symbols[opcode] for opcode in program.opcodes if opcode > VARIABLE]
+            max_depth = program.max_depth
+        else:
+            symbols = []
+            depth = max_depth = 0
+            for symbol in program.array:
+                if type(symbol) != str or symbol in free_variables or symbol[0] == '[':
+                    depth += 1
+                elif symbol in operators and symbol not in ('(', ')'):
+                    symbols.append(symbol)
+                    if not operators[symbol].is_unary:
+                        depth -= 1
+                max_depth = max(depth, max_depth)
+
+        with self._lock:
+            for symbol in symbols:
+                self.operators[symbol] += 1
+            self.max_depth = max(max_depth, self.max_depth)
+        self.record_error(Evaluate.error_code(result))
+
+    def record_error(self, code):
+        """Counts one error, given its error code (NO_ERROR is ignored)."""
+
+        if code != NO_ERROR:
+            with self._lock:
+                self.errors[('domain', 'div_by_zero', 'overflow', 'invalid')[code - 1]] += 1
+
+    def to_prometheus(self, prefix='calculator'):
+        """
+        Returns the timers and counters in the Prometheus text exposition format.
+
+            Parameters:
+                prefix (str): the start of each metric name
+
+            Returns:
+                text (str): one line per sample, with HELP and TYPE lines for each metric
+        """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        stages = snapshot['stages']
+        metric('stage_calls_total', 'counter', "Calls to each engine stage.",
+               [(f'{{stage="{stage}"}}', stages[stage]['calls']) for stage in stages])
+        metric('stage_seconds_total', 'counter', "Time spent in each engine stage.",
+               [(f'{{stage="{stage}"}}', repr(stages[stage]['seconds'])) for stage in stages])
+        metric('operator_evaluations_total', 'counter', "Operators in evaluated programs.",
+               [(f'{{symbol="{symbol}"}}', count) for symbol, count in snapshot['operators'].items()])
+        metric('max_stack_depth', 'gauge', "Deepest operand stack of any evaluated program.",
+               [('', snapshot['max_depth'])])
+        metric('errors_total', 'counter', "Evaluations that gave each kind of error.",
+               [(f'{{type="{error}"}}', count) for error, count in snapshot['errors'].items()])
+        return '\n'.join(lines) + '\n'
+
+"""A simple data structure containing all operators that will be used."""
+# operator attributes:   symbol, priority, is_unary, output_string, button_string, and func (function to execute)
+operators = {'+': Operator('+',     1,      False,      '+',            '+',        lambda x, y: x + y),
+             '-': Operator('-',     1,      False,      '-',            '-',        lambda x, y: x - y),
+             '*': Operator('*',     2,      False,      '\u00D7',       '\u00D7',   lambda x, y: x * y),
+             '/': Operator('/',     2,      False,      '\u00F7',       '\u00F7',   lambda x, y: x / y),
+             '^': Operator('^',     3,      False,      '^',            '^',        lambda x, y: x ** y), 
+             '~': Operator('~',     4,      True,       '-',            '\u00B1',   lambda x: x * -1),
+             's': Operator('s',     4,      True,       'SIN(',         'SIN',      lambda x: m.sin(x)),
+             'c': Operator('c',     4,      True,       'COS(',         'COS',      lambda x: m.cos(x)),
+             't': Operator('t',     4,      True,       'TAN(',         'TAN',      lambda x: m.tan(x)),
+             'g': Operator('g',     4,      True,       'COT(',         'COT',      lambda x: m.cotangent(x)),
+             'l': Operator('l',     4,      True,       'LOG(',         'LOG',      lambda x: m.log10(x)),
+             'n': Operator('n',     4,      True,       'LN(',          'LN',       lambda x: m.log(x)),
+             'q': Operator('q',     4,      True,       '\u221A(',      '\u221A',   lambda x: m.sqrt(x)), 
+             '(': Operator('(',     4,      True,       '(',            '(',        lambda x: x), # use for infix only
+             ')': Operator(')',     4,      True,       ')',            ')',        lambda x: x), # use for infix only
+             '.': Operator('.',     5,      True,       '.',            '.',        lambda x: x), # use for infix only
+             'i': Operator('i',     5,      True,       '^-1',          '1/x',      lambda x: x)  # use for infix only
+            }
+
+"""Symbols which stand for a value supplied when the expression is evaluated."""
+free_variables = ('x',)
+
+"""Matches a named variable, written [name] (e.g. the cells of CalculatorWorkbook), with the name as group 1.
+   Its symbol keeps the brackets, so it can't be mistaken for an operator, but its value is supplied by name."""
+reference_pattern = re.compile(r'\[([A-Za-z_][A-Za-z0-9_]*)\]')
+
+"""NumPy ufunc names used by Evaluate.evaluate_array in place of operator functions."""
+# any operator without a ufunc is applied element-wise through its func
+numpy_operators = {'+': 'add',
+                   '-': 'subtract',
+                   '*': 'multiply',
+                   '/': 'true_divide',
+                   '^': 'power',
+                   '~': 'negative',
+                   's': 'sin',
+                   'c': 'cos',
+                   't': 'tan',
+                   'l': 'log10',
+                   'n': 'log',
+                   'q': 'sqrt'
+                  }
+
+"""Opcodes of the compact program format (see Program)."""
+# push the next constant, push the value of the next variable, then one per operator
+CONSTANT = 0
+VARIABLE = 1
+opcodes = {symbol: index + 2 for index, symbol in enumerate(operators)}
+opcode_symbols = [None, None] + list(operators)
+
+"""Functions used by Evaluate.run in place of the operator functions, where they are the same."""
+vm_functions = {'+': add,
+                '-': sub,
+                '*': mul,
+                '/': truediv,
+                '^': pow,
+                '~': neg,
+                's': m.sin,
+                'c': m.cos,
+                't': m.tan,
+                'l': m.log10,
+                'n': m.log,
+                'q': m.sqrt
+               }
+
+def build_dispatch_table(functions=vm_functions):
+    """
+    Builds the table Evaluate.run uses to execute each opcode.
+
+        Parameters:
+            functions (dict): functions to use in place of the operator functions
+
+        Returns:
+            table (list): an (arity, function, error message) tuple for each opcode,
+                          where the message is returned for a negative operand of a unary operator,
+                          or a zero second operand of a binary operator (None if there is no check)
+    """
+
+    table = [(0, None, None), (0, None, None)]
+    for symbol in operators:
+        func = functions.get(symbol, operators[symbol].func)
+        if symbol in ('(', ')'):
+            # parentheses left in postfix are ignored
+            table.append((0, None, None))
+        elif operators[symbol].is_unary:
+            message = f"Domain Error: {operators[symbol].button_str}" if symbol in ('l', 'n', 'q') else None
+            table.append((1, func, message))
+        else:
+            table.append((2, func, "Error: Div by 0" if symbol == '/' else None))
+    return table
+
+dispatch_table = build_dispatch_table()
+
+"""Numeric modes. 'float' computes everything with floats. 'exact' keeps integers as ints
+   and the results of / and 1/x as fractions, and only uses floats for the transcendental
+   operators (and powers with a fractional exponent)."""
+numeric_modes = ('float', 'exact')
+
+def exact_number(literal):
+    """
+    Converts a number literal for exact mode.
+
+        Parameters:
+            literal (str): the digits of the number, with an optional decimal point
+
+        Returns:
+            number (int or Fraction): the exact value of the literal
+    """
+
+    if '.' not in literal:
+        return int(literal)
+
+    # fractions (and decimal, which it imports) are only loaded for exact mode
+    from fractions import Fraction
+    value = Fraction(literal)
+    return value.numerator if value.denominator == 1 else value
+
+def exact_divide(x, y):
+    """Divides two numbers, exactly unless either is a float."""
+
+    if type(x) is float or type(y) is float:
+        return x / y
+
+    from fractions import Fraction
+    value = Fraction(x, y)
+    return value.numerator if value.denominator == 1 else value
+
+def exact_power(x, y):
+    """Raises x to the power y, exactly if y is an integer (and x isn't a float)."""
+
+    # fractional exponents have to be computed with floats
+    if type(x) is float or type(y) is not int:
+        return float(x) ** float(y)
+
+    # integer exponentiation for integer powers
+    if y >= 0:
+        return x ** y
+
+    from fractions import Fraction
+    value = Fraction(x) ** y
+    return value.numerator if value.denominator == 1 else value
+
+def exact_result(value):
+    """Returns the result of an exact mode evaluation, as an int if possible."""
+
+    if type(value) is int:
+        return value
+    if type(value) is not float and hasattr(value, 'denominator'):
+        # arithmetic on fractions can give a whole number, e.g. Fraction(3, 2) * 2 is Fraction(3, 1)
+        return value.numerator if value.denominator == 1 else value
+    return int(value) if value.is_integer() else value
+
+"""Functions used in place of the operator functions in exact mode."""
+exact_functions = {'/': exact_divide,
+                   '^': exact_power
+                  }
+
+exact_dispatch_table = build_dispatch_table({**vm_functions, **exact_functions})
+
+"""Error codes reported by Evaluate.evaluate_many, one for each expression."""
+NO_ERROR = 0
+DOMAIN_ERROR = 1
+DIV_BY_ZERO = 2
+OVERFLOW = 3
+INVALID = 4 # the expression could not be parsed or evaluated
+TOO_COSTLY = 5 # the expression was rejected before running (see CalculatorGuard)
+
+"""Patterns used by Evaluate.tokenize to scan an expression in one pass."""
+# a number literal, or a named variable or any other single character
+token_pattern = re.compile(r'([0-9]+\.?[0-9]*|\.[0-9]*)|(\[[A-Za-z_][A-Za-z0-9_]*\]|.)', re.DOTALL)
+# a number with two decimal points
+two_decimals_pattern = re.compile(r'\.[0-9]*\.')
+# every character allowed in an internal expression string
+valid_characters = frozenset('0123456789.').union(operators, free_variables)
+
+"""The same patterns for bytes, used by Evaluate.tokenize_bytes to scan without decoding."""
+bytes_token_pattern = re.compile(token_pattern.pattern.encode(), re.DOTALL)
+bytes_two_decimals_pattern = re.compile(two_decimals_pattern.pattern.encode())
+# any byte which isn't a valid character
+invalid_byte_pattern = re.compile(b'[^' + re.escape(''.join(sorted(valid_characters))).encode() + b']')
+# the symbol for each valid (non-digit) byte
+byte_symbols = {character.encode(): character for character in valid_characters}
+
+"""Parsed postfix programs, keyed by internal expression string."""
+postfix_cache = ProgramCache()
+
+"""Compact programs (see Program), keyed by internal expression string."""
+program_cache = ProgramCache()
+
+"""Compiled programs (see Evaluate.compile), keyed by internal expression string."""
+compiled_cache = ProgramCache()
+
+"""Program libraries (see CalculatorLibrary) which Evaluate.convert_to_program takes programs from before parsing."""
+program_libraries = []
+
+"""Optimizers (see CalculatorOptimizer) which Evaluate.convert_to_program runs, in order, over each float mode
+   expression it parses. None are installed by default, so programs are run as they were typed."""
+program_optimizers = []
+
+"""Instrumentation of the engine (see Metrics), disabled until metrics.enable() is called."""
+metrics = Metrics()
+
+"""Python source templates used by Evaluate.compile in place of calling operator functions."""
+# any operator without a template is compiled as a call to its func
+inline_operators = {'+': '{0} + {1}',
+                    '-': '{0} - {1}',
+                    '*': '{0} * {1}',
+                    '/': '{0} / {1}',
+                    '^': '{0} ** {1}',
+                    '~': '{0} * -1',
+                    's': '_sin({0})',
+                    'c': '_cos({0})',
+                    't': '_tan({0})',
+                    'l': '_log10({0})',
+                    'n': '_log({0})',
+                    'q': '_sqrt({0})'
+                   }
+
+class Evaluate:
+    """A class which performs the backend functions of a calculator.
+       This includes translating it to postfix notation, 
+       evaluating the postfix notation, and providing a string
+       representation of the internal symbolic expression."""
+    
+    @staticmethod
+    def convert_to_postfix(infix_expression: str, mode='float') -> Stack:
+        """
+        Converts a string infix expression to a postfix stack.
+        Previously parsed expressions are served from postfix_cache.
+
+            Parameters:
+                infix_expression (str): the mathematical expression in infix notation
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        # reuse the parsed program if we've seen this expression before
+        key = infix_expression if mode == 'float' else (mode, infix_expression)
+        program = postfix_cache.get(key)
+        if program is None:
+            program = tuple(Evaluate.parse(infix_expression, mode).array)
+            postfix_cache.put(key, program)
+
+        # hand out a fresh stack so callers can't modify the cached program
+        postfix_stack = Stack()
+        postfix_stack.array = list(program)
+        postfix_stack.top = len(program) - 1
+        return postfix_stack
+
+    @staticmethod
+    def parse(infix_expression: str, mode='float') -> Stack:
+        """
+        Converts a string infix expression to a postfix stack, without using the cache.
+
+            Parameters:
+                infix_expression (str): the mathematical expression in infix notation
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        return Evaluate.parse_tokens(Evaluate.tokenize(infix_expression, mode))
+
+    @staticmethod
+    def parse_bytes(infix_expression, mode='float') -> Stack:
+        """
+        Converts an infix expression held in bytes to a postfix stack, without decoding it or using the cache.
+
+            Parameters:
+                infix_expression (bytes-like): the mathematical expression in infix notation
+                                               (such as a memoryview of a memory map)
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        return Evaluate.parse_tokens(Evaluate.tokenize_bytes(infix_expression, mode))
+
+    @staticmethod
+    def tokenize(infix_expression: str, mode='float') -> list:
+        """
+        Splits a string infix expression into numbers and symbols in a single scan.
+
+            Parameters:
+                infix_expression (str): the mathematical expression in infix notation
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                tokens (list): a number for each number (a float, or an int or Fraction in exact mode),
+                               and the symbol of each operator or variable
+        """
+
+        if mode not in numeric_modes:
+            raise Exception(f"unknown numeric mode: {mode}")
+
+        # a decimal point followed by another one (without an operator between) is invalid
+        if two_decimals_pattern.search(infix_expression):
+            raise Exception("Error: two decimals in this number!")
+
+        # check that every character is a digit, a decimal point, an operator or a variable
+        if not valid_characters.issuperset(infix_expression):
+            # named variables are the only other characters allowed
+            if '[' not in infix_expression or not valid_characters.issuperset(reference_pattern.sub('', infix_expression)):
+                raise Exception("invalid operator: infix conversion")
+
+        number_type = float if mode == 'float' else exact_number
+        return [number_type(number) if number else symbol
+                for number, symbol in token_pattern.findall(infix_expression)]
+
+    @staticmethod
+    def tokenize_bytes(infix_expression, mode='float') -> list:
+        """
+        Splits an infix expression held in bytes into numbers and symbols, without decoding it.
+        Gives the same tokens (and errors) as Evaluate.tokenize.
+
+            Parameters:
+                infix_expression (bytes-like): the mathematical expression in infix notation
+                                               (such as a memoryview of a memory map)
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                tokens (list): see Evaluate.tokenize
+        """
+
+        if mode not in numeric_modes:
+            raise Exception(f"unknown numeric mode: {mode}")
+
+        if bytes_two_decimals_pattern.search(infix_expression):
+            raise Exception("Error: two decimals in this number!")
+
+        if invalid_byte_pattern.search(infix_expression):
+            raise Exception("invalid operator: infix conversion")
+
+        # float() reads ASCII bytes directly, except a lone '.', which it rejects
+        # (decode that so the error message is the same as Evaluate.tokenize's)
+        if mode == 'float':
+            number_type = lambda literal: float(literal) if literal != b'.' else float('.')
+        else:
+            number_type = lambda literal: exact_number(literal.decode())
+        return [number_type(number) if number else byte_symbols[symbol]
+                for number, symbol in bytes_token_pattern.findall(infix_expression)]
+
+    @staticmethod
+    def parse_tokens(tokens: list) -> Stack:
+        """
+        Converts a list of tokens (see Evaluate.tokenize) to a postfix stack.
+
+            Parameters:
+                tokens (list): the numbers and symbols of the expression, in infix order
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        priority = {symbol: operator.priority for symbol, operator in operators.items()}
+
+        # keeps track of the operators before pushing to postfix
+        operator_stack = []
+
+        # will be the final postfix representation
+        postfix = []
+
+        for token in tokens:
+
+            # operands (numbers and variables) go straight to postfix
+            if token.__class__ is not str or token in free_variables or token[0] == '[':
+                postfix.append(token)
+
+            # if the symbol is a close parentheses, pop from operator_stack
+            #  and push to postfix until we reach a (, s, t, c, or l (priority 4)
+            elif token == ')':
+                while priority[operator_stack[-1]] < 4:
+                    postfix.append(operator_stack.pop())
+                # if the new top element of operator_stack is parentheses, discard
+                if operator_stack[-1] == '(':
+                    operator_stack.pop()
+                # otherwise, the new top element of operator_stack is a trig/log function,
+                # pop and push to postfix
+                else:
+                    postfix.append(operator_stack.pop())
+
+            # if top of operator stack is (, s, c, t, or l, just ignore priority and push operator to stack
+            elif operator_stack and priority[operator_stack[-1]] == 4:
+                operator_stack.append(token)
+
+            else:
+                # if this symbol's priority is less than/equal the priority
+                #  of the top operator on the stack, pop from operator_stack
+                #  and push to postfix until the symbol priority is greater than top element
+                while operator_stack and priority[token] <= priority[operator_stack[-1]]:
+                    # stop popping if we hit a (, s, t, c, or l
+                    if priority[operator_stack[-1]] == 4:
+                        break
+                    postfix.append(operator_stack.pop())
+
+                # then push operator to stack
+                operator_stack.append(token)
+
+        # if there are remaining elements in the operator_stack,
+        #  pop and push to postfix until empty
+        postfix.extend(reversed(operator_stack))
+
+        postfix_stack = Stack()
+        postfix_stack.array = postfix
+        postfix_stack.top = len(postfix) - 1
+        return postfix_stack
+    
+    @staticmethod
+    def evaluate(postfix_expression: Stack, variables=None, mode='float') -> float:
+        """
+        Evaluates a postfix expression.
+        
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                variables (dict): the value of each variable in the expression (optional)
+                mode (str): the numeric mode the expression was parsed in (see numeric_modes)
+                                            
+            Returns:
+                result (float or int): the result of the mathematical expression
+                                       (or a Fraction, in exact mode)
+        """
+        
+        exact = mode == 'exact'
+        
+        # temporary stack to keep track of operands during evaluation
+        operand_stack = Stack()
+            
+        for symbol in postfix_expression.array:
+            
+            # if digit, push to stack
+            if type(symbol) != str:
+                operand_stack.push(symbol)
+
+            # if variable, push its value to stack (a named variable's without the brackets)
+            elif symbol in free_variables or symbol[0] == '[':
+                name = symbol[1:-1] if symbol[0] == '[' else symbol
+                if variables is None or name not in variables:
+                    raise Exception(f"unbound variable: {name}")
+                operand_stack.push(variables[name] if exact else float(variables[name]))
+                               
+            # check if its a valid operator
+            elif symbol not in operators:
+                # TODO: throw error
+                raise Exception("invalid operator: postfix evaluation")
+                            
+            # handle parentheses (this shouldn't happen)
+            elif symbol == '(' or symbol == ')':
+                # do nothing: there may be extra parentheses if closing parentheses are missing
+                continue
+                            
+            # handle unary operators
+            elif operators[symbol].is_unary:
+                
+                # pop the sole operand
+                sole_operand = operand_stack.pop()
+                
+                # don't allow log or square root of negative
+                if sole_operand < 0 and symbol in ('l', 'n', 'q'):
+                    return f"Domain Error: {operators[symbol].button_str}"
+                
+                try:
+                    # apply funciton assigned to that operator
+                    result = operators[symbol].func(sole_operand)
+                except OverflowError:
+                    # an exact integer too big for a float
+                    return "Error: Overflow"
+                
+                # push result back to operand stack
+                operand_stack.push(result)
+            
+            # handle binary operators
+            else:
+                
+                # pop two operands
+                second_operand = operand_stack.pop()
+                first_operand = operand_stack.pop()
+                
+                # don't allow divide by zero
+                if symbol == '/' and second_operand == 0:
+                    return "Error: Div by 0"
+                
+                # exact mode has its own division and power
+                func = operators[symbol].func
+                if exact and symbol in exact_functions:
+                    func = exact_functions[symbol]
+                
+                try:
+                    # apply function assigned to that operator
+                    result = func(first_operand, second_operand)
+                except OverflowError:
+                    return "Error: Overflow"
+                
+                # push result back to operand stack
+                operand_stack.push(result)
+                
+        # the result should be the one remaining element of this stack
+        if operand_stack.top != 0:
+            # TODO: throw error
+            raise Exception("postfix evaluation exception: operands remaining")
+            
+        result = operand_stack.pop()
+        
+        if exact:
+            return exact_result(result)
+        
+        # return as an integer, if possible
+        if result.is_integer():
+            return int(result)
+        else: 
+            return result
+
+    @staticmethod
+    def compile(postfix_expression: Stack, mode='float'):
+        """
+        Compiles a postfix expression into a Python function.
+        Calling the function gives the same result as Evaluate.evaluate
+        (including the error strings), without interpreting each token.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                mode (str): the numeric mode the expression was parsed in (see numeric_modes)
+
+            Returns:
+                program (function): a function taking the variables dictionary (optional)
+                                    which returns the result of the mathematical expression
+        """
+
+        exact = mode == 'exact'
+
+        # names available to the generated code
+        namespace = {'_sin': m.sin, '_cos': m.cos, '_tan': m.tan,
+                     '_log10': m.log10, '_log': m.log, '_sqrt': m.sqrt,
+                     '_divide': exact_divide, '_power': exact_power, '_exact_result': exact_result}
+        lines = ['def _program(variables=None):']
+
+        # exact mode has its own division and power
+        templates = inline_operators
+        if exact:
+            templates = {**inline_operators, '/': '_divide({0}, {1})', '^': '_power({0}, {1})'}
+
+        # each variable is looked up once, at the start of the function
+        for symbol in dict.fromkeys(postfix_expression.array):
+            if type(symbol) != str or not (symbol in free_variables or symbol[0] == '['):
+                continue
+            variable = symbol[1:-1] if symbol[0] == '[' else symbol
+            lines.append(f'    if variables is None or {variable!r} not in variables: '
+                         f'raise Exception("unbound variable: {variable}")')
+            lines.append(f'    _x_{variable} = ' + (f'variables[{variable!r}]' if exact else f'float(variables[{variable!r}])'))
+
+        # names of the values computed so far, in place of the operand stack
+        operand_stack = []
+
+        for symbol in postfix_expression.array:
+
+            # constants are referred to directly
+            if type(symbol) != str:
+                name = f'_k{len(namespace)}'
+                namespace[name] = symbol
+                operand_stack.append(name)
+                continue
+
+            if symbol in free_variables or symbol[0] == '[':
+                operand_stack.append(f'_x_{symbol.strip("[]")}')
+                continue
+
+            if symbol not in operators:
+                raise Exception("invalid operator: postfix evaluation")
+
+            if symbol == '(' or symbol == ')':
+                continue
+
+            # use the template if there is one, otherwise call the operator's function
+            template = templates.get(symbol)
+            if template is None:
+                name = f'_f{len(namespace)}'
+                namespace[name] = operators[symbol].func
+                template = name + ('({0})' if operators[symbol].is_unary else '({0}, {1})')
+
+            result = f'_v{len(lines)}'
+
+            if operators[symbol].is_unary:
+                if not operand_stack:
+                    return Evaluate.interpreted(postfix_expression, mode)
+                sole_operand = operand_stack.pop()
+
+                # don't allow log or square root of negative
+                if symbol in ('l', 'n', 'q'):
+                    lines.append(f'    if {sole_operand} < 0: return {f"Domain Error: {operators[symbol].button_str}"!r}')
+                if symbol == '~':
+                    lines.append(f'    {result} = ' + template.format(sole_operand))
+                else:
+                    # an exact integer too big for a float
+                    lines.append('    try:')
+                    lines.append(f'        {result} = ' + template.format(sole_operand))
+                    lines.append('    except OverflowError:')
+                    lines.append('        return "Error: Overflow"')
+
+            else:
+                if len(operand_stack) < 2:
+                    return Evaluate.interpreted(postfix_expression, mode)
+                second_operand = operand_stack.pop()
+                first_operand = operand_stack.pop()
+
+                # don't allow divide by zero
+                if symbol == '/':
+                    lines.append(f'    if {second_operand} == 0: return "Error: Div by 0"')
+                lines.append('    try:')
+                lines.append(f'        {result} = ' + template.format(first_operand, second_operand))
+                lines.append('    except OverflowError:')
+                lines.append('        return "Error: Overflow"')
+
+            operand_stack.append(result)
+
+        # the result should be the one remaining value
+        if len(operand_stack) != 1:
+            return Evaluate.interpreted(postfix_expression, mode)
+
+        # return as an integer, if possible
+        if exact:
+            lines.append(f'    return _exact_result({operand_stack[0]})')
+        else:
+            lines.append(f'    return int({operand_stack[0]}) if {operand_stack[0]}.is_integer() else {operand_stack[0]}')
+
+        exec('\n'.join(lines), namespace)
+        return namespace['_program']
+
+    @staticmethod
+    def interpreted(postfix_expression: Stack, mode='float'):
+        """
+        Returns a function which evaluates a copy of the postfix expression with Evaluate.evaluate.
+        Used by Evaluate.compile for malformed programs, where evaluate may stop at an error
+        before it finds the missing or remaining operands.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                mode (str): the numeric mode the expression was parsed in (see numeric_modes)
+
+            Returns:
+                program (function): see Evaluate.compile
+        """
+
+        postfix_stack = Stack()
+        postfix_stack.array = list(postfix_expression.array)
+        postfix_stack.top = len(postfix_stack.array) - 1
+        return lambda variables=None: Evaluate.evaluate(postfix_stack, variables, mode)
+
+    @staticmethod
+    def compile_expression(infix_expression: str, mode='float'):
+        """
+        Returns the compiled function for an infix expression, compiling it only once.
+
+            Parameters:
+                infix_expression (str): the mathematical expression in infix notation
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                program (function): see Evaluate.compile
+        """
+
+        key = infix_expression if mode == 'float' else (mode, infix_expression)
+        program = compiled_cache.get(key)
+        if program is None:
+            program = Evaluate.compile(Evaluate.convert_to_postfix(infix_expression, mode), mode)
+            compiled_cache.put(key, program)
+        return program
+
+    @staticmethod
+    def evaluate_array(postfix_expression: Stack, variables, masked=False):
+        """
+        Evaluates a postfix expression for every element of the given NumPy arrays at once.
+        Elements with a domain error, a division by zero or an overflow become NaN.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                variables (dict): an array (or number) of values for each variable in the expression
+                masked (bool): return a masked array, with the errors masked, instead of NaNs
+
+            Returns:
+                result (numpy.ndarray): the result of the mathematical expression for each element
+        """
+
+        import numpy as np
+
+        arrays = {name: np.asarray(value, dtype=float) for name, value in variables.items()}
+        shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+
+        # temporary stack to keep track of operand arrays during evaluation
+        operand_stack = []
+
+        with np.errstate(all='ignore'):
+            for symbol in postfix_expression.array:
+
+                if type(symbol) != str:
+                    operand_stack.append(float(symbol))
+                    continue
+
+                if symbol in free_variables or symbol[0] == '[':
+                    name = symbol[1:-1] if symbol[0] == '[' else symbol
+                    if name not in arrays:
+                        raise Exception(f"unbound variable: {name}")
+                    operand_stack.append(arrays[name])
+                    continue
+
+                if symbol not in operators:
+                    raise Exception("invalid operator: postfix evaluation")
+
+                if symbol == '(' or symbol == ')':
+                    continue
+
+                # use the ufunc if there is one, otherwise apply the operator's function per element
+                if symbol in numpy_operators:
+                    func = getattr(np, numpy_operators[symbol])
+                else:
+                    func = np.frompyfunc(operators[symbol].func, 1 if operators[symbol].is_unary else 2, 1)
+
+                if operators[symbol].is_unary:
+                    sole_operand = np.asarray(operand_stack.pop(), dtype=float)
+                    result = np.asarray(func(sole_operand), dtype=float)
+
+                    # log of non-positive and square root of negative are domain errors
+                    if symbol in ('l', 'n'):
+                        result = np.where(sole_operand <= 0, np.nan, result)
+                    elif symbol == 'q':
+                        result = np.where(sole_operand < 0, np.nan, result)
+
+                else:
+                    second_operand = np.asarray(operand_stack.pop(), dtype=float)
+                    first_operand = np.asarray(operand_stack.pop(), dtype=float)
+                    result = np.asarray(func(first_operand, second_operand), dtype=float)
+
+                    # division by zero, and overflow from finite operands, are errors
+                    if symbol == '/':
+                        result = np.where(second_operand == 0, np.nan, result)
+                    result = np.where(np.isinf(result) & np.isfinite(first_operand) & np.isfinite(second_operand),
+                                      np.nan, result)
+
+                operand_stack.append(result)
+
+        # the result should be the one remaining element of this stack
+        if len(operand_stack) != 1:
+            raise Exception("postfix evaluation exception: operands remaining")
+
+        # constant expressions still give one value per element
+        result = np.array(np.broadcast_to(operand_stack[0], shape), dtype=float)
+
+        if masked:
+            return np.ma.masked_invalid(result)
+        return result
+
+    @staticmethod
+    def convert_to_program(infix_expression: str, mode='float') -> Program:
+        """
+        Converts a string infix expression to a compact program, parsing it only once
+        (and not at all if an installed program library has it).
+
+            Parameters:
+                infix_expression (str): the mathematical expression in infix notation
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                program (Program): the mathematical expression in compact postfix form
+        """
+
+        key = infix_expression if mode == 'float' else (mode, infix_expression)
+        program = program_cache.get(key)
+        if program is None:
+            program = Evaluate.find_in_libraries(infix_expression, mode)
+            if program is None:
+                program = Evaluate.assemble(Evaluate.parse(infix_expression, mode), mode)
+            program_cache.put(key, program)
+        return program
+
+    @staticmethod
+    def assemble(postfix_expression, mode='float'):
+        """
+        Assembles a newly parsed expression into a program, running the installed optimizers over it first.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+                mode (str): the numeric mode it was parsed in (see numeric_modes)
+
+            Returns:
+                program (Program): the mathematical expression in compact postfix form
+        """
+
+        # the optimizers fold constants with float arithmetic
+        if mode == 'float':
+            for optimizer in program_optimizers:
+                postfix_expression = optimizer.optimize_postfix(postfix_expression)
+        return Program.from_postfix(postfix_expression, mode)
+
+    @staticmethod
+    def find_in_libraries(infix_expression, mode='float'):
+        """Returns the program of an expression from the first installed program library which has it (or None)."""
+
+        for library in program_libraries:
+            program = library.get(infix_expression, mode)
+            if program is not None:
+                return program
+        return None
+
+    @staticmethod
+    def convert_bytes_to_program(infix_expression, mode='float') -> Program:
+        """
+        Converts an infix expression held in bytes to a compact program, parsing it only once.
+        A memoryview is looked up in program_cache without copying it; only new
+        expressions are copied, to bytes, to be kept as keys.
+
+            Parameters:
+                infix_expression (bytes-like): the mathematical expression in infix notation
+                                               (bytes, or a read-only memoryview)
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                program (Program): the mathematical expression in compact postfix form
+        """
+
+        key = infix_expression if mode == 'float' else (mode, infix_expression)
+        program = program_cache.get(key)
+        if program is None:
+            program = Evaluate.find_in_libraries(infix_expression, mode)
+            if program is None:
+                program = Evaluate.assemble(Evaluate.parse_bytes(infix_expression, mode), mode)
+            key = bytes(infix_expression) if mode == 'float' else (mode, bytes(infix_expression))
+            program_cache.put(key, program)
+        return program
+
+    @staticmethod
+    def run(program: Program, variables=None):
+        """
+        Evaluates a compact program. Gives the same results as Evaluate.evaluate.
+
+            Parameters:
+                program (Program): the mathematical expression in compact postfix form
+                variables (dict): the value of each variable in the expression (optional)
+
+            Returns:
+                result (float, int or str): the result of the mathematical expression,
+                                            or the error message
+        """
+
+        # a malformed program may still stop at an error first, let evaluate decide
+        if not program.well_formed:
+            return Evaluate.evaluate(program.to_postfix(), variables, program.mode)
+
+        exact = program.mode == 'exact'
+        table = exact_dispatch_table if exact else dispatch_table
+        constants = program.constants
+        names = program.names
+
+        # preallocated operand stack, sp is the number of operands on it
+        operand_stack = [0.0] * program.max_depth
+        sp = 0
+        next_constant = 0
+        next_name = 0
+
+        for opcode in program.opcodes:
+
+            if opcode == CONSTANT:
+                operand_stack[sp] = constants[next_constant]
+                next_constant += 1
+                sp += 1
+                continue
+
+            if opcode == VARIABLE:
+                name = names[next_name]
+                if variables is None or name not in variables:
+                    raise Exception(f"unbound variable: {name}")
+                operand_stack[sp] = variables[name] if exact else float(variables[name])
+                next_name += 1
+                sp += 1
+                continue
+
+            arity, func, message = table[opcode]
+
+            if arity == 1:
+                sole_operand = operand_stack[sp - 1]
+                # don't allow log or square root of negative
+                if message is not None and sole_operand < 0:
+                    return message
+                try:
+                    operand_stack[sp - 1] = func(sole_operand)
+                except OverflowError:
+                    # an exact integer too big for a float
+                    return "Error: Overflow"
+
+            elif arity == 2:
+                sp -= 1
+                second_operand = operand_stack[sp]
+                # don't allow divide by zero
+                if message is not None and second_operand == 0:
+                    return message
+                try:
+                    operand_stack[sp - 1] = func(operand_stack[sp - 1], second_operand)
+                except OverflowError:
+                    return "Error: Overflow"
+
+        result = operand_stack[0]
+
+        if exact:
+            return exact_result(result)
+
+        # return as an integer, if possible
+        if result.is_integer():
+            return int(result)
+        else:
+            return result
+
+    @staticmethod
+    def error_code(result) -> int:
+        """
+        Returns the error code for a result of Evaluate.evaluate.
+
+            Parameters:
+                result (float, int or str): the result of Evaluate.evaluate
+
+            Returns:
+                code (int): NO_ERROR, DOMAIN_ERROR, DIV_BY_ZERO, OVERFLOW or TOO_COSTLY
+        """
+
+        if type(result) != str:
+            return NO_ERROR
+        if result.startswith("Domain Error"):
+            return DOMAIN_ERROR
+        if result == "Error: Div by 0":
+            return DIV_BY_ZERO
+        if result == "Error: Too Costly":
+            return TOO_COSTLY
+        return OVERFLOW
+
+    @staticmethod
+    def evaluate_many(expressions, workers=None, chunksize=1024, mode='float') -> list:
+        """
+        Evaluates many infix expressions, optionally across a pool of processes.
+
+            Parameters:
+                expressions (iterable of str): the mathematical expressions in infix notation
+                workers (int): the number of processes to use (None or 1 evaluates serially)
+                chunksize (int): the number of expressions sent to a process at a time
+                mode (str): the numeric mode (see numeric_modes)
+
+            Returns:
+                results (list): a (result, error code) tuple for each expression, in input order.
+                                When the code is INVALID the result is the exception message.
+        """
+
+        return list(Evaluate.evaluate_stream(expressions, workers, chunksize, mode))
+
+    @staticmethod
+    def evaluate_stream(expressions, workers=None, chunksize=1024, mode='float'):
+        """
+        Evaluates many infix expressions, yielding each result as soon as it is ready.
+        Only a few chunks per worker are in flight at once, so the input may be unbounded.
+
+            Parameters:
+                expressions (iterable of str): the mathematical expressions in infix notation
+                workers (int): the number of processes to use (None or 1 evaluates serially)
+                chunksize (int): the number of expressions sent to a process at a time
+                mode (str): the numeric mode (see numeric_modes)
+
+            Yields:
+                result (tuple): see Evaluate.evaluate_many
+        """
+
+        chunks = iter_chunks(expressions, chunksize)
+
+        # serial fallback, same chunks so the results match exactly
+        if workers is None or workers <= 1:
+            for chunk in chunks:
+                yield from evaluate_chunk(chunk, mode)
+            return
+
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(evaluate_chunk, chunk, mode))
+                # wait for the oldest chunk once enough work is queued
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    @staticmethod
+    def evaluate_mapped(path, workers=None, chunk_bytes=1 << 20, mode='float'):
+        """
+        Evaluates every expression (one per line) of a file through a memory map, yielding each result
+        in order. Lines are never decoded or copied to strings, and only a few chunks of results are
+        held at once, so memory use doesn't grow with the size of the file.
+
+            Parameters:
+                path (str): the file to read
+                workers (int): the number of processes to use (None or 1 evaluates serially);
+                               each maps the file itself and evaluates a range of bytes
+                chunk_bytes (int): the size of the range of the file sent to a process at a time
+                mode (str): the numeric mode (see numeric_modes)
+
+            Yields:
+                result (tuple): see Evaluate.evaluate_many
+        """
+
+        import mmap
+
+        with open(path, 'rb') as file:
+            # an empty file can't be mapped
+            if os_size(file) == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # pages are read once, in order, so the kernel can read ahead and drop them behind
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+                if workers is None or workers <= 1:
+                    expressions = map_expressions(mapped)
+                    try:
+                        for expression in expressions:
+                            result = evaluate_bytes(expression, mode)
+                            # let go of the view, so the map can be closed
+                            expression.release()
+                            yield result
+                    finally:
+                        expressions.close()
+                    return
+
+                # split the file at line ends, about chunk_bytes apart
+                ranges = []
+                start = 0
+                while start < len(mapped):
+                    end = mapped.find(b'\n', min(start + chunk_bytes, len(mapped)) - 1)
+                    end = len(mapped) if end == -1 else end + 1
+                    ranges.append((start, end))
+                    start = end
+
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(executor.submit(evaluate_mapped_chunk, path, start, end, mode))
+                # wait for the oldest chunk once enough work is queued
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    # gets the string representation of an infix expression
+    @staticmethod
+    def to_string(infix_expression: str):
+        """
+        Returns the string representation of a given infix expression.
+
+            Parameters:
+                infix_expression (str): the mathematical expression represented 
+                                        by symbols for internal use
+                
+            Returns: 
+                result (str): the string representation of that mathematical expression
+        """
+        
+        result = ''
+        
+        for symbol in infix_expression:
+            
+            if symbol in operators:
+                result += operators[symbol].output_str
+            
+            else:
+                result += symbol
+
+        return result
+
+class IncrementalParser:
+    """A class which converts an infix expression to postfix one symbol at a time,
+       so the expression never has to be rescanned. Every symbol pushed can be undone."""
+
+    def __init__(self, infix_expression=''):
+
+        # postfix so far (only ever appended to, so undoing just truncates it)
+        self.output = []
+
+        # operators waiting to go to postfix, as linked (symbol, rest) cells,
+        # so the state before each symbol can be kept without copying
+        self.operator_stack = None
+
+        # the number being typed, and whether it has a decimal point
+        self.current_number = ''
+        self.number_has_decimal = False
+
+        # open parentheses and trig/log functions (and negations) not yet closed
+        self.paren_depth = 0
+
+        # the exception to raise when the parse is finished, if any
+        self.error = None
+
+        # the state before each symbol, for undoing
+        self.history = []
+
+        self.extend(infix_expression)
+
+    def __len__(self):
+        return len(self.history)
+
+    def push(self, symbol):
+        """
+        Adds one symbol to the end of the expression.
+
+            Parameters:
+                symbol (str): a digit, '.', a variable or an operator
+        """
+
+        self.history.append((len(self.output), self.operator_stack, self.current_number,
+                             self.number_has_decimal, self.paren_depth, self.error))
+
+        # after an error, only keep track of parentheses and decimals
+        if self.error is not None:
+            if symbol == '.':
+                self.number_has_decimal = True
+            elif symbol in operators:
+                self.number_has_decimal = False
+                if symbol == ')':
+                    self.paren_depth -= 1
+                elif operators[symbol].priority == 4:
+                    self.paren_depth += 1
+            return
+
+        try:
+            self.parse_symbol(symbol)
+        except Exception as error:
+            self.error = error
+
+    def extend(self, symbols):
+        """
+        Adds each symbol of a string to the end of the expression.
+
+            Parameters:
+                symbols (str): the symbols to add
+        """
+
+        for symbol in symbols:
+            self.push(symbol)
+
+    def pop(self):
+        """Removes the last symbol from the expression, restoring the state before it."""
+
+        if not self.history:
+            return
+        (output_length, self.operator_stack, self.current_number,
+         self.number_has_decimal, self.paren_depth, self.error) = self.history.pop()
+        del self.output[output_length:]
+
+    def parse_symbol(self, symbol):
+        """
+        Applies one step of the conversion to postfix (see Evaluate.parse_tokens).
+
+            Parameters:
+                symbol (str): a digit, '.', a variable or an operator
+        """
+
+        # operands go straight to postfix,
+        # but we have to get the full number first
+        if symbol.isdigit():
+            self.current_number += symbol
+            return
+
+        # append decimal to number
+        if symbol == '.':
+            if self.number_has_decimal:
+                raise Exception("Error: two decimals in this number!")
+            self.current_number += '.'
+            self.number_has_decimal = True
+            return
+
+        if symbol not in free_variables and symbol not in operators:
+            raise Exception("invalid operator: infix conversion")
+
+        # first, add the full number to postfix
+        if self.current_number:
+            self.output.append(float(self.current_number))
+            self.current_number = ''
+            self.number_has_decimal = False
+
+        if symbol in free_variables:
+            self.output.append(symbol)
+            return
+
+        top = self.operator_stack
+
+        # if the symbol is a close parentheses, pop to postfix
+        #  until we reach a (, s, t, c, or l (priority 4)
+        if symbol == ')':
+            self.paren_depth -= 1
+            while top is not None and operators[top[0]].priority < 4:
+                self.output.append(top[0])
+                top = top[1]
+            if top is None:
+                raise Exception("invalid expression: unmatched close parentheses")
+            # discard the parentheses, but a trig/log function goes to postfix
+            if top[0] != '(':
+                self.output.append(top[0])
+            self.operator_stack = top[1]
+            return
+
+        if operators[symbol].priority == 4:
+            self.paren_depth += 1
+
+        # if top of operator stack is (, s, c, t, or l, just push operator to stack
+        if top is not None and operators[top[0]].priority == 4:
+            self.operator_stack = (symbol, top)
+            return
+
+        # pop operators of greater or equal priority to postfix (stopping at priority 4)
+        priority = operators[symbol].priority
+        while top is not None and priority <= operators[top[0]].priority != 4:
+            self.output.append(top[0])
+            top = top[1]
+        self.operator_stack = (symbol, top)
+
+    def finish(self) -> Stack:
+        """
+        Completes the conversion, closing any open parentheses.
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        if self.error is not None:
+            raise self.error
+
+        postfix = self.output[:]
+        if self.current_number:
+            postfix.append(float(self.current_number))
+
+        # remaining operators go to postfix, top first
+        top = self.operator_stack
+        while top is not None:
+            postfix.append(top[0])
+            top = top[1]
+
+        postfix_stack = Stack()
+        postfix_stack.array = postfix
+        postfix_stack.top = len(postfix) - 1
+        return postfix_stack
+
+def iter_chunks(iterable, chunksize):
+    """
+    Splits an iterable into lists of at most chunksize elements.
+
+        Parameters:
+            iterable (iterable): the elements to split
+            chunksize (int): the maximum length of each list
+
+        Yields:
+            chunk (list): the next elements of the iterable
+    """
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def evaluate_chunk(expressions, mode='float'):
+    """
+    Evaluates a list of infix expressions (the unit of work for Evaluate.evaluate_many).
+
+        Parameters:
+            expressions (list of str): the mathematical expressions in infix notation
+            mode (str): the numeric mode (see numeric_modes)
+
+        Returns:
+            results (list): a (result, error code) tuple for each expression
+    """
+
+    results = []
+    for expression in expressions:
+        try:
+            result = Evaluate.run(Evaluate.convert_to_program(expression, mode))
+        except Exception as error:
+            results.append((str(error), INVALID))
+        else:
+            results.append((result, Evaluate.error_code(result)))
+    return results
+
+"""Matches each non-blank line of a bytes buffer, with the line less its surrounding whitespace as group 1."""
+line_pattern = re.compile(rb'[^\S\r\n]*(\S(?:[^\r\n]*\S)?)')
+
+def os_size(file):
+    """Returns the size of an open file, in bytes."""
+
+    import os
+    return os.fstat(file.fileno()).st_size
+
+def map_expressions(buffer, start=0, end=None):
+    """
+    Splits a bytes buffer (such as a memory map) into expressions, one per non-blank line,
+    without copying it.
+
+        Parameters:
+            buffer (bytes-like): the buffer to scan
+            start (int): the offset to start from
+            end (int): the offset to stop at (default: the end of the buffer)
+
+        Yields:
+            expression (memoryview): the next expression, as a slice of the buffer
+    """
+
+    view = memoryview(buffer)
+    try:
+        for match in line_pattern.finditer(buffer, start, len(buffer) if end is None else end):
+            first, last = match.span(1)
+            yield view[first:last]
+    finally:
+        view.release()
+
+def evaluate_bytes(expression, mode='float'):
+    """
+    Evaluates one infix expression held in bytes (see Evaluate.convert_bytes_to_program).
+
+        Parameters:
+            expression (bytes-like): the mathematical expression in infix notation
+            mode (str): the numeric mode (see numeric_modes)
+
+        Returns:
+            result (tuple): the result (or exception message) and the error code
+    """
+
+    try:
+        result = Evaluate.run(Evaluate.convert_bytes_to_program(expression, mode))
+    except Exception as error:
+        return (str(error), INVALID)
+    return (result, Evaluate.error_code(result))
+
+def evaluate_mapped_chunk(path, start, end, mode='float'):
+    """
+    Evaluates the expressions in a range of bytes of a file (the unit of work for Evaluate.evaluate_mapped).
+
+        Parameters:
+            path (str): the file to read
+            start (int): the offset of the first line of the range
+            end (int): the offset just after the last line of the range
+            mode (str): the numeric mode (see numeric_modes)
+
+        Returns:
+            results (list): a (result, error code) tuple for each expression
+    """
+
+    import mmap
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL, start - start % mmap.PAGESIZE, end - start + start % mmap.PAGESIZE)
+        results = []
+        for expression in map_expressions(mapped, start, end):
+            results.append(evaluate_bytes(expression, mode))
+            expression.release()
+        return results
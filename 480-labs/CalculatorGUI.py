@@ -0,0 +1,872 @@
+# -*- coding: utf-8 -*-
+"""
+The tkinter view of the calculator.
+"""
+
+import queue
+import threading
+import time
+import tkinter as tk
+import tkinter.font as tkfont
+from CalculatorEngine import Evaluate, IncrementalParser, Program, operators, free_variables
+from CalculatorPlot import Plot
+
+def is_operand(symbol):
+    """Returns whether an internal symbol is part of an operand (a digit or a variable)."""
+    return symbol.isdigit() or symbol in free_variables
+
+def evaluation_worker(jobs, results):
+    """
+    Evaluates jobs until it is given None (the body of the GUI's worker thread).
+    
+        Parameters:
+            jobs (queue.Queue): (job number, postfix expression) tuples to evaluate
+            results (queue.Queue): where to put a (job number, result) tuple for each job
+    """
+    
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        number, postfix = job
+        try:
+            result = Evaluate.evaluate(postfix)
+        except Exception:
+            # a malformed expression (e.g. an unmatched ')' before an operand)
+            result = "Error: Invalid"
+        results.put((number, result))
+
+def preview_worker(jobs, results):
+    """
+    Evaluates previews until none are waiting (the body of the GUI's preview thread).
+    Only the newest job waiting is evaluated, the others are out of date.
+    
+        Parameters:
+            jobs (queue.Queue): (job number, postfix expression) tuples to evaluate
+            results (queue.Queue): where to put a (job number, result, seconds taken) tuple for each job
+    """
+    
+    while True:
+        job = None
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+        if job is None:
+            return
+        number, postfix = job
+        start = time.perf_counter()
+        try:
+            program = Program.from_postfix(postfix)
+            result = Evaluate.run(program) if program.well_formed else ''
+        except Exception:
+            result = ''
+        results.put((number, result, time.perf_counter() - start))
+
+class ExpressionBuffer:
+    """A class which holds the expression being typed as a list of internal symbols,
+       each with its output text, so adding or removing the last symbol doesn't
+       rebuild the expression or output strings."""
+
+    def __init__(self, expression=''):
+        self.symbols = []
+        self.outputs = []
+        # the length of the output text
+        self.length = 0
+        self.extend(expression)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def last(self):
+        """Returns the last symbol ('' if the buffer is empty)."""
+        return self.symbols[-1] if self.symbols else ''
+
+    def extend(self, symbols):
+        """
+        Adds symbols to the end of the expression.
+
+            Parameters:
+                symbols (str): the internal symbols to add
+
+            Returns:
+                output (str): the output text of the added symbols
+        """
+
+        outputs = [Evaluate.to_string(symbol) for symbol in symbols]
+        self.symbols.extend(symbols)
+        self.outputs.extend(outputs)
+        output = ''.join(outputs)
+        self.length += len(output)
+        return output
+
+    def pop(self):
+        """Removes the last symbol and returns it."""
+
+        self.length -= len(self.outputs.pop())
+        return self.symbols.pop()
+
+    @property
+    def expression(self):
+        """The internal expression string."""
+        return ''.join(self.symbols)
+
+    @property
+    def output_string(self):
+        """The output text of the whole expression."""
+        return ''.join(self.outputs)
+
+class GUI():
+    """A class which controls the view of the calculator."""
+
+    def __init__(self, timeout=10.0):
+        """
+        Parameters:
+            timeout (float): the longest time, in seconds, enter waits for a result
+        """
+            
+        # design elements
+        self.colors = ["#22223B", "#B1C9A6", "#9A8C98", "#C9ADA7", "#F2E9E4"]
+        self.font = 'Arial '
+        self.terminal_fontsize = '20'
+        self.button_fontsize = '16'
+        
+        # internal state
+        self.create_state(timeout)
+        
+        # handy button storage
+        self.buttons = []
+        
+        # create frame
+        self.root = tk.Tk()
+        self.root.title("Calculator")
+        self.root.geometry("400x500")
+        
+        # shared fonts: resizing changes these two fonts instead of every widget's font
+        self.terminal_font = tkfont.Font(self.root, self.font + self.terminal_fontsize, name='CalculatorTerminal')
+        self.button_font = tkfont.Font(self.root, self.font + self.button_fontsize, name='CalculatorButton')
+        
+        # configure grid for dynamic resizing
+        for i in range(9):
+            tk.Grid.rowconfigure(self.root, i, weight=1)
+        for i in range(5):
+            tk.Grid.columnconfigure(self.root, i, weight=1)
+        
+        # create terminal entry (disabled for typing)
+        self.terminal = tk.Entry(self.root, borderwidth=5, font=self.terminal_font, state='disabled')
+        self.terminal.grid(row=0, column=0, columnspan=5, sticky='nesw')
+        
+        # create scrollbar and result preview under the terminal
+        display = tk.Frame(self.root)
+        display.grid(row=1, columnspan=5, sticky='nesw')
+        scroll = tk.Scrollbar(display, orient='horizontal')
+        scroll.pack(fill='x')
+        scroll.config(command=self.terminal.xview)
+        self.terminal.config(xscrollcommand=scroll.set)
+        self.preview = tk.Label(display, anchor='e', fg=self.colors[2], font=self.button_font)
+        self.preview.pack(fill='both', expand=True)
+        
+        # create the gui
+        self.create_gui()
+
+        # bind resize function to window resizing
+        self.root.bind('<Configure>', self.resize_text)
+        
+        # main loop
+        self.root.mainloop()
+        
+    def create_state(self, timeout=10.0):
+        """A method which sets up the internal state (everything but the widgets)."""
+        
+        # expression typed so far, and the error message shown instead of it (if any)
+        self.buffer = ExpressionBuffer()
+        self.error = ''
+        self.is_result = False
+        
+        # expression parsed so far, updated with every symbol
+        self.parser = IncrementalParser()
+        
+        # live preview: wait this long (ms) after the last key before evaluating,
+        # and back off if evaluating takes longer than the frame budget (s)
+        self.preview_delay = 50
+        self.preview_base_delay = 50
+        self.preview_max_delay = 1000
+        self.preview_budget = 0.008
+        self.pending_preview = None
+        
+        # the preview is evaluated on its own thread, so a long expression doesn't hold up typing;
+        # preview_job is the number of the newest preview, and the results of older ones are dropped
+        self.preview_jobs = queue.Queue()
+        self.preview_results = queue.Queue()
+        self.preview_thread = None
+        self.preview_job = 0
+        self.preview_waiting = False
+        self.pending_preview_poll = None
+        
+        # window resizes are handled once the burst of <Configure> events is over;
+        # resize_updates is the number of fonts changed by the last resize
+        self.pending_resize = None
+        self.resize_events = 0
+        self.resize_updates = 0
+        
+        # enter evaluates on a worker thread, whose results are polled for every poll_interval ms;
+        # job is the number of the evaluation being waited for (None when idle), and any
+        # other result that arrives (from a cancelled or timed out job) is dropped
+        self.timeout = timeout
+        self.poll_interval = 16
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.job = None
+        self.job_count = 0
+        self.job_started = 0
+        self.pending_poll = None
+        
+    def create_gui(self):
+        """A method which creates and configures all the buttons."""
+        
+        # create number buttons and add to grid
+        self.create_number_buttons()
+        
+        # create operator buttons and add to grid
+        self.create_operator_buttons()
+        
+        # create utitilty buttons (enter, clear, etc) and add to grid
+        self.create_utility_buttons()
+        
+        # update all button fonts
+        for button in self.buttons:
+            button.config(font=self.button_font)
+        
+    def create_number_buttons(self):
+        """A method which creates and places each number buttons."""
+        
+        # create number buttons
+        for i in range(10):
+            self.buttons.append(tk.Button(self.root, text=str(i), bg=self.colors[4], command=lambda i=i: self.number_command(str(i))))
+            
+        # add number buttons to grid
+        self.buttons[7].grid(row=4, column=1, sticky='nesw')
+        self.buttons[8].grid(row=4, column=2, sticky='nesw')
+        self.buttons[9].grid(row=4, column=3, sticky='nesw')
+        self.buttons[4].grid(row=5, column=1, sticky='nesw')
+        self.buttons[5].grid(row=5, column=2, sticky='nesw')
+        self.buttons[6].grid(row=5, column=3, sticky='nesw')
+        self.buttons[1].grid(row=6, column=1, sticky='nesw')
+        self.buttons[2].grid(row=6, column=2, sticky='nesw')
+        self.buttons[3].grid(row=6, column=3, sticky='nesw')
+        self.buttons[0].grid(row=7, column=1, sticky='nesw')
+        
+    def create_operator_buttons(self):
+        """A method which creates and places each operator button."""
+        
+        # decimal "."
+        decimal_button = tk.Button(self.root, text=operators["."].button_str, bg=self.colors[4], command=lambda: self.operator_command("."))
+        decimal_button.grid(row=7, column=2, sticky='nesw')
+        self.buttons.append(decimal_button)
+        
+        # negation "~"
+        negation_button = tk.Button(self.root, text=operators['~'].button_str, bg=self.colors[4], command=lambda: self.operator_command('~'))
+        negation_button.grid(row=7, column=3, sticky='nesw')
+        self.buttons.append(negation_button)
+        
+        # divide "/"
+        divide_button = tk.Button(self.root, text=operators['/'].button_str, bg=self.colors[2], command=lambda: self.operator_command('/'))
+        divide_button.grid(row=3, column=1, sticky='nesw')
+        self.buttons.append(divide_button)
+        
+        # multiply "*"
+        multiply_button = tk.Button(self.root, text=operators['*'].button_str, bg=self.colors[2], command=lambda: self.operator_command('*'))
+        multiply_button.grid(row=3, column=2, sticky='nesw')
+        self.buttons.append(multiply_button)
+        
+        # addition "+"
+        addition_button = tk.Button(self.root, text=operators['+'].button_str, bg=self.colors[2], command=lambda: self.operator_command('+'))
+        addition_button.grid(row=3, column=3, sticky='nesw')
+        self.buttons.append(addition_button)
+        
+        # subtraction "-"
+        subtraction_button = tk.Button(self.root, text=operators['-'].button_str, bg=self.colors[2], command=lambda: self.operator_command('-'))
+        subtraction_button.grid(row=3, column=4, sticky='nesw')
+        self.buttons.append(subtraction_button)
+        
+        # natural log "n"
+        natural_log_button = tk.Button(self.root, text=operators['n'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('n'))
+        natural_log_button.grid(row=7, column=0, sticky='nesw')
+        self.buttons.append(natural_log_button)
+        
+        # base-10 log "l"
+        log10_button = tk.Button(self.root, text=operators['l'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('l'))
+        log10_button.grid(row=6, column=0, sticky='nesw')
+        self.buttons.append(log10_button)
+        
+        # sin "s"
+        sin_button = tk.Button(self.root, text=operators['s'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('s'))
+        sin_button.grid(row=5, column=0, sticky='nesw')
+        self.buttons.append(sin_button)
+        
+        # cos "c"
+        cos_button = tk.Button(self.root, text=operators['c'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('c'))
+        cos_button.grid(row=4, column=0, sticky='nesw')
+        self.buttons.append(cos_button)
+        
+        # tan "t"
+        tan_button = tk.Button(self.root, text=operators['t'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('t'))
+        tan_button.grid(row=3, column=0, sticky='nesw')
+        self.buttons.append(tan_button)
+        
+        # exponent "^"
+        exponent_button = tk.Button(self.root, text=operators['^'].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('^'))
+        exponent_button.grid(row=2, column=2, sticky='nesw')
+        self.buttons.append(exponent_button)
+        
+        # open parentheses "("
+        open_paren_button = tk.Button(self.root, text=operators['('].button_str, bg=self.colors[0], fg = self.colors[4], command=lambda: self.operator_command('('))
+        open_paren_button.grid(row=2, column=3, sticky='nesw')
+        self.buttons.append(open_paren_button)
+        
+        # close parentheses ")"
+        close_paren_button = tk.Button(self.root, text=operators[')'].button_str, bg=self.colors[0], fg=self.colors[4], command=lambda: self.operator_command(')'))
+        close_paren_button.grid(row=2, column=4, sticky='nesw')
+        self.buttons.append(close_paren_button)
+        
+        # square root 'q'
+        square_root_button = tk.Button(self.root, text=operators['q'].button_str, bg=self.colors[0], fg=self.colors[4], command=lambda: self.operator_command('q'))
+        square_root_button.grid(row=2, column=0, sticky='nesw')
+        self.buttons.append(square_root_button)
+        
+        # multiplicative inverse
+        mult_inverse_button = tk.Button(self.root, text=operators['i'].button_str, bg=self.colors[0], fg=self.colors[4], command=lambda: self.operator_command('i'))
+        mult_inverse_button.grid(row=2, column=1, sticky='nesw')
+        self.buttons.append(mult_inverse_button)
+        
+    def create_utility_buttons(self):
+        """A method which creates and places each utitily button (enter/clear/backspace)."""
+        
+        # enter button
+        enter_button = tk.Button(self.root, text='Enter', bg=self.colors[1], command=lambda: self.enter_command())
+        enter_button.grid(row=6, column=4, rowspan=2, sticky='nesw')
+        self.buttons.append(enter_button)
+                
+        # clear button
+        clear_button = tk.Button(self.root, text='Clear', bg=self.colors[3], command=lambda: self.clear_command())
+        clear_button.grid(row=5, column=4, sticky='nesw')
+        self.buttons.append(clear_button)
+                
+        # back button
+        back_button = tk.Button(self.root, text='Back', bg=self.colors[3], command=lambda: self.back_command())
+        back_button.grid(row=4, column=4, sticky='nesw')
+        self.buttons.append(back_button)
+        
+        # variable "x"
+        variable_button = tk.Button(self.root, text='x', bg=self.colors[0], fg=self.colors[4], command=lambda: self.variable_command('x'))
+        variable_button.grid(row=8, column=0, sticky='nesw')
+        self.buttons.append(variable_button)
+        
+        # plot button
+        plot_button = tk.Button(self.root, text='Plot', bg=self.colors[1], command=lambda: self.plot_command())
+        plot_button.grid(row=8, column=1, columnspan=3, sticky='nesw')
+        self.buttons.append(plot_button)
+        
+        # cancel button (only enabled while a result is being calculated)
+        self.cancel_button = tk.Button(self.root, text='Cancel', bg=self.colors[3], state='disabled', command=lambda: self.cancel_command())
+        self.cancel_button.grid(row=8, column=4, sticky='nesw')
+        self.buttons.append(self.cancel_button)
+    
+    @property
+    def expression(self):
+        """The internal expression string typed so far."""
+        return self.buffer.expression
+    
+    @property
+    def output_string(self):
+        """The text shown in the terminal."""
+        return self.error or self.buffer.output_string
+    
+    def update_terminal(self):
+        """A method which clears and re-renders the calculator terminal."""
+        
+        self.render_tail(0, self.output_string)
+    
+    def render_tail(self, start, text=''):
+        """
+        A method which replaces the end of the terminal text, leaving the rest of it untouched.
+        
+            Parameters:
+                start (int): the index from which the terminal text is replaced
+                text (str): the new text after start
+        """
+        
+        self.terminal.config(state='normal')
+        self.terminal.delete(start, 'end')
+        if text:
+            self.terminal.insert('end', text)
+        self.terminal.config(state='disabled') # re-disable input for typing
+        
+        self.schedule_preview()
+    
+    def add_to_terminal(self, symbol):
+        """
+        A method which adds a symbol to the calculator terminal.
+        
+            Parameters:
+                symbol (str): A string containing a mathematical symbol (or set of symbols)                 
+        """
+        
+        # update expression and terminal
+        start = self.buffer.length
+        self.parser.extend(symbol)
+        self.render_tail(start, self.buffer.extend(symbol))
+    
+    def schedule_preview(self):
+        """A method which (re)starts the wait before the preview is updated, so fast typing only evaluates once."""
+        
+        if self.pending_preview is not None:
+            self.root.after_cancel(self.pending_preview)
+        self.pending_preview = self.root.after(self.preview_delay, self.update_preview)
+    
+    def update_preview(self):
+        """A method which sends the expression typed so far to the preview thread, to show its value under the terminal."""
+        
+        self.pending_preview = None
+        
+        # nothing to preview for results, errors, or an empty terminal (or while calculating)
+        if self.is_result or not self.buffer or self.job is not None:
+            self.cancel_preview()
+            self.preview.config(text='')
+            return
+        
+        # finish the parse typed so far (open parentheses are closed); only this copy is
+        # made on this thread, the program is assembled and run on the preview thread
+        try:
+            postfix = self.parser.finish()
+        except Exception:
+            self.cancel_preview()
+            self.preview.config(text='')
+            return
+        
+        self.preview_job += 1
+        self.preview_jobs.put((self.preview_job, postfix))
+        self.preview_waiting = True
+        self.start_preview_thread()
+        if self.pending_preview_poll is None:
+            self.pending_preview_poll = self.root.after(self.poll_interval, self.poll_preview)
+    
+    def poll_preview(self):
+        """A method which shows the newest preview if the preview thread has finished it, or else checks again later."""
+        
+        self.pending_preview_poll = None
+        if not self.preview_waiting:
+            return
+        
+        while True:
+            try:
+                number, result, seconds = self.preview_results.get_nowait()
+            except queue.Empty:
+                break
+            if number != self.preview_job:
+                continue
+            self.preview_waiting = False
+            
+            # errors are only shown when enter is pressed
+            if type(result) == str:
+                result = ''
+            self.preview.config(text=f"= {result}" if result != '' else '')
+            
+            # if that took longer than a frame, wait longer between previews
+            if seconds > self.preview_budget:
+                self.preview_delay = min(self.preview_delay * 2, self.preview_max_delay)
+            else:
+                self.preview_delay = self.preview_base_delay
+            return
+        
+        # the thread may have found the queue empty just before the job was put on it
+        self.start_preview_thread()
+        self.pending_preview_poll = self.root.after(self.poll_interval, self.poll_preview)
+    
+    def start_preview_thread(self):
+        """A method which starts the preview thread if it isn't running (it stops once there are no previews to evaluate)."""
+        
+        if self.preview_thread is None or not self.preview_thread.is_alive():
+            self.preview_thread = threading.Thread(target=preview_worker,
+                                                   args=(self.preview_jobs, self.preview_results), daemon=True)
+            self.preview_thread.start()
+    
+    def cancel_preview(self):
+        """A method which stops waiting for the preview being evaluated (its result will be dropped)."""
+        
+        if self.preview_waiting:
+            self.preview_job += 1
+            self.preview_waiting = False
+        if self.pending_preview_poll is not None:
+            self.root.after_cancel(self.pending_preview_poll)
+            self.pending_preview_poll = None
+    
+    # button commands
+    def number_command(self, symbol):
+        """
+        A method that handles pressing a number button.
+        
+            Paramters:
+                symbol (str): the symbol representing the pressed button
+        """
+        
+        # the expression can't change while it is being calculated
+        if self.job is not None:
+            return
+        
+        # if an error is shown, clear output and update terminal
+        if self.error:
+            self.clear_command()
+            
+        # if it's a result, don't add another digit to it
+        # instead, clear and replace the result
+        if self.is_result:
+            self.is_result = False
+            self.clear_command()
+        
+        # a number can't follow a variable
+        if self.buffer.last() in free_variables:
+            return
+        
+        # update expression and terminal with new symbol
+        start = self.buffer.length
+        self.parser.push(symbol)
+        self.render_tail(start, self.buffer.extend(symbol))
+            
+    def operator_command(self, symbol):
+        """
+        A method that handles pressing an operator button.
+        
+            Paramters:
+                symbol (str): the symbol representing the pressed button
+        """
+        
+        # the expression can't change while it is being calculated
+        if self.job is not None:
+            return
+         
+        # if an error is shown, clear output
+        if self.error:
+            self.clear_command()
+        
+        # if it's a result, that's fine, we can add an operator
+        if self.is_result:
+            self.is_result = False
+        
+        last = self.buffer.last()
+                
+        # if terminal is clear, don't allow binary operators, ')', or '.'
+        if not self.buffer:
+            if symbol in (')', '.') or not operators[symbol].is_unary:
+                return
+        
+        # handle close parentheses
+        elif symbol == ')':
+            # don't allow placement after operators (unless its ')')
+            if last != ')' and last in operators:
+                return
+            
+            # if there are no open parentheses/trig/log functions, don't allow placement of )
+            if self.parser.paren_depth <= 0:
+                return
+ 
+        # if negation operator follows an operand, put in front
+        # if it follows another negator, delete both
+        elif symbol == '~':
+            if is_operand(last):
+                return
+            if last == '~':
+                self.buffer.pop()
+                self.parser.pop()
+                symbol = ''
+                self.render_tail(self.buffer.length)
+        
+        # decimal must follow an operand, 
+        # and if multiple, must be separated by operators
+        elif symbol == '.':
+            if not last.isdigit():
+                return
+            # check if this number already has a decimal
+            if self.parser.number_has_decimal:
+                return
+                
+        # multiplicative inverse must follow an operand
+        # replace symbol 'i' with '^~1'
+        elif symbol == 'i':
+            if not is_operand(last):
+                return
+            symbol = '^~1'
+        
+        # if priority 4 operators (parentheses and trig/log) 
+        # follow an operand or '.', add a multiply first
+        # (exclude close parentheses)
+        elif symbol in operators and operators[symbol].priority == 4:
+            if is_operand(last) or last == '.':
+                symbol = '*' + symbol
+        
+        # all other operators cannot follow another operator (unless it's ')')
+        elif symbol in operators and operators[symbol].priority < 4:
+            if self.buffer and not (is_operand(last) or last == ')'):
+                return
+                
+        self.add_to_terminal(symbol)
+    
+    def variable_command(self, symbol):
+        """
+        A method that handles pressing a variable button.
+        
+            Paramters:
+                symbol (str): the symbol representing the pressed button
+        """
+        
+        # the expression can't change while it is being calculated
+        if self.job is not None:
+            return
+        
+        # if an error is shown, clear output
+        if self.error:
+            self.clear_command()
+        
+        # like a number, a variable replaces a result
+        if self.is_result:
+            self.is_result = False
+            self.clear_command()
+        
+        # a variable after an operand or ')' multiplies it
+        last = self.buffer.last()
+        if is_operand(last) or last in ('.', ')'):
+            symbol = '*' + symbol
+        
+        self.add_to_terminal(symbol)
+    
+    def is_complete(self):
+        """A method which returns whether the expression ends with an operand (any ')' excluded)."""
+        
+        for char in reversed(self.buffer.symbols):
+            if char == ')':
+                continue
+            return is_operand(char) or char == '.'
+        return False
+    
+    def plot_command(self):
+        """A method that handles pressing the plot button: graphs the expression as a function of x."""
+        
+        if not self.buffer or self.is_result or self.job is not None or not self.is_complete():
+            return
+        
+        try:
+            Plot(self.root, self.buffer.expression)
+        except Exception:
+            # the expression can't be compiled (e.g. two decimals in a number)
+            return
+    
+    def enter_command(self):
+        """A method that handles pressing the enter button."""
+        
+        if not self.terminal.get(): # enter only if non-empty
+            return 
+        
+        # already calculating
+        if self.job is not None:
+            return
+        
+        # make sure it ends with an operand (any ')' excluded)
+        if not self.is_complete():
+            # do nothing, need another operand
+            return
+        
+        # an expression in x has no single value, plot it instead
+        if any(symbol in free_variables for symbol in self.buffer.symbols):
+            self.plot_command()
+            return
+        
+        # evaluate on the worker thread (the expression has been parsed as it was typed)
+        self.start_evaluation(self.parser.finish())
+    
+    def start_evaluation(self, postfix):
+        """
+        A method which sends an expression to the worker thread and shows that it is being calculated.
+        
+            Parameters:
+                postfix (Stack): the expression to evaluate, in postfix notation
+        """
+        
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=evaluation_worker, args=(self.jobs, self.results), daemon=True)
+            self.worker.start()
+        
+        self.job_count += 1
+        self.job = self.job_count
+        self.job_started = time.perf_counter()
+        self.jobs.put((self.job, postfix))
+        
+        # busy: the preview says so, and only cancel (or clear) does anything
+        if self.pending_preview is not None:
+            self.root.after_cancel(self.pending_preview)
+            self.pending_preview = None
+        self.cancel_preview()
+        self.preview.config(text='Calculating...')
+        self.root.config(cursor='watch')
+        self.cancel_button.config(state='normal')
+        self.pending_poll = self.root.after(self.poll_interval, self.poll_result)
+    
+    def poll_result(self):
+        """A method which shows the result if the worker thread has finished, gives up once the timeout has passed, or else checks again later."""
+        
+        self.pending_poll = None
+        if self.job is None:
+            return
+        
+        # drop the results of jobs that were cancelled or timed out
+        while True:
+            try:
+                number, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if number == self.job:
+                self.end_evaluation()
+                self.show_result(result)
+                return
+        
+        # the worker can't be stopped, so it is left behind (see abandon_worker)
+        if time.perf_counter() - self.job_started > self.timeout:
+            self.end_evaluation()
+            self.abandon_worker()
+            self.show_result("Error: Timeout")
+            return
+        
+        self.pending_poll = self.root.after(self.poll_interval, self.poll_result)
+    
+    def end_evaluation(self):
+        """A method which stops waiting for the worker thread and leaves the busy state."""
+        
+        self.job = None
+        if self.pending_poll is not None:
+            self.root.after_cancel(self.pending_poll)
+            self.pending_poll = None
+        self.preview.config(text='')
+        self.root.config(cursor='')
+        self.cancel_button.config(state='disabled')
+    
+    def abandon_worker(self):
+        """
+        A method which leaves the worker thread to finish its expression alone: the next one
+        starts on a new thread with new queues, instead of waiting behind it. The old thread
+        is a daemon, which stops after its expression (or with the program).
+        """
+        
+        if self.worker is None:
+            return
+        self.jobs.put(None)
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+    
+    def show_result(self, result):
+        """
+        A method which replaces the expression with its result (or error message).
+        
+            Parameters:
+                result (float, int or str): the result of the expression, or an error message
+        """
+        
+        # this is a result (cannot be followed by backspace or operand)
+        self.is_result = True
+        
+        # if no error is passed, update expression and output strings
+        if type(result) != str:
+            
+            # if negative, convert - to ~
+            if result < 0:
+                expression = "~" + str(result)[1:]
+            else:
+                expression = str(result)
+        
+        else: # error has been passed
+            self.error = result
+            expression = ''
+        self.buffer = ExpressionBuffer(expression)
+        self.parser = IncrementalParser(expression)
+        
+        # update terminal
+        self.update_terminal()
+    
+    def cancel_command(self):
+        """A method that handles pressing the cancel button: stops waiting for the result, keeping the expression."""
+        
+        if self.job is None:
+            return
+        self.end_evaluation()
+        self.abandon_worker()
+        self.schedule_preview()
+        
+    def clear_command(self):
+        """A method that handles pressing the clear button."""
+        
+        # clearing also cancels a calculation
+        if self.job is not None:
+            self.end_evaluation()
+            self.abandon_worker()
+        
+        # if it was a result, it's not anymore
+        if self.is_result:
+            self.is_result = False
+        
+        # update expression and output strings
+        self.buffer = ExpressionBuffer()
+        self.parser = IncrementalParser()
+        self.error = ''
+        
+        # update terminal
+        self.update_terminal()
+        
+    def back_command(self):
+        """A method that handles pressing the back button."""
+        
+        # if expression is empty (or being calculated), do nothing
+        if not self.buffer or self.job is not None:
+            return
+        
+        # if expression is a result, just clear everything
+        if self.is_result:
+            self.clear_command()
+            return
+        
+        # remove the last symbol (the buffer knows the length of its output)
+        self.buffer.pop()
+        self.parser.pop()
+        
+        # remove only that symbol's output from the terminal
+        self.render_tail(self.buffer.length)
+        
+    def resize_text(self, window):
+        """A method which schedules resize_fonts for when Tk is idle, however many <Configure> events arrive first."""
+        
+        self.resize_events += 1
+        if self.pending_resize is None:
+            self.pending_resize = self.root.after_idle(self.resize_fonts)
+        
+    def resize_fonts(self):
+        """A method which resizes the button and terminal text according to window size."""
+        
+        self.pending_resize = None
+        self.resize_updates = 0
+        
+        # size constraint is the smaller of width and height        
+        width = self.root.winfo_width()
+        height = self.root.winfo_height()
+        size = width if width < height else height
+        
+        # resize terminal font size according to width/height (if it changed)
+        if self.terminal_fontsize != str(size // 20):
+            self.terminal_fontsize = str(size // 20)
+            self.terminal_font.configure(size=size // 20)
+            self.resize_updates += 1
+        
+        # resize button (and preview) font size according to width/height
+        if self.button_fontsize != str(size // 25):
+            self.button_fontsize = str(size // 25)
+            self.button_font.configure(size=size // 25)
+            self.resize_updates += 1
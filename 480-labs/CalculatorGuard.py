@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+A static cost estimate of a program, and a guard which decides from it whether a
+program may run: cheap programs go straight to the fast path, costly ones to a slow
+lane, and any over the budgets are rejected before they run (see CalculatorServer).
+
+The estimate walks the postfix program once with an abstract operand stack, holding
+each operand's kind (int, fraction or float), an upper bound on its size in bits, and
+its value while that is small enough to compute for free. In float mode every operation
+is cheap (a power that is too big overflows at once), so only the length of the program
+matters; in exact mode integer powers can grow without limit, e.g. 9^9^9^9.
+
+    guard = ResourceGuard(max_bits=1 << 20)
+    if guard.classify(program) != REJECT:
+        result = Evaluate.run(program)
+"""
+
+import math as m
+from CalculatorEngine import (Evaluate, ProgramCache, CONSTANT, VARIABLE, opcode_symbols,
+                              dispatch_table, exact_dispatch_table)
+
+"""The decisions of ResourceGuard.classify."""
+FAST = 'fast'
+SLOW = 'slow'
+REJECT = 'reject'
+
+"""The result of a program rejected by a ResourceGuard."""
+too_costly = "Error: Too Costly"
+
+"""Operand values of at most this many bits are computed while estimating, so powers of them are bounded exactly."""
+known_bits = 256
+
+"""The size, in bits, assumed for a float, and for a variable whose value isn't given."""
+float_bits = 64
+
+"""The operators which compute with floats whatever their operand (and so count as nested calls)."""
+transcendental = frozenset('sctlnqg')
+
+"""Costs of programs without variables, keyed like Evaluate.convert_to_program's cache."""
+cost_cache = ProgramCache()
+
+class Cost:
+    """A class which holds the static cost estimate of a program."""
+
+    __slots__ = ('nodes', 'nesting', 'bits', 'work')
+
+    def __init__(self, nodes, nesting, bits, work):
+        """
+        Parameters:
+            nodes (int): the number of operands and operators
+            nesting (int): the deepest nesting of transcendental calls (SIN, LOG, etc.)
+            bits (float): an upper bound on the size of the largest operand, in bits (inf if unbounded)
+            work (float): a rough count of the machine word operations needed (inf if unbounded)
+        """
+
+        self.nodes = nodes
+        self.nesting = nesting
+        self.bits = bits
+        self.work = work
+
+    def __repr__(self):
+        return f"Cost(nodes={self.nodes}, nesting={self.nesting}, bits={self.bits:.0f}, work={self.work:.0f})"
+
+def size(value):
+    """Returns the size of a number, in bits (the numerator and denominator of a fraction)."""
+
+    if type(value) is int:
+        return max(value.bit_length(), 1)
+    if type(value) is float:
+        return float_bits
+    return value.numerator.bit_length() + value.denominator.bit_length()
+
+def kind(value):
+    """Returns the kind of a number: 'int', 'fraction' or 'float'."""
+
+    if type(value) is int:
+        return 'int'
+    if type(value) is float:
+        return 'float'
+    return 'fraction'
+
+def estimate_cost(program, variables=None):
+    """
+    Estimates how big the operands of a program get and how much work it takes, without running it.
+
+        Parameters:
+            program (Program): the mathematical expression in compact postfix form
+            variables (dict): the value of each variable in the expression (optional,
+                              a variable without a value is assumed to be a float-sized number)
+
+        Returns:
+            cost (Cost): the estimate
+    """
+
+    if program.mode == 'float':
+        return estimate_float_cost(program)
+
+    table = exact_dispatch_table
+    constants = iter(program.constants)
+    names = iter(program.names)
+
+    # each operand is a (kind, bits, value or None, nesting) tuple
+    stack = []
+    small = ('int', 1, None, 0)
+    largest = 1
+    work = 0.0
+    nesting = 0
+
+    for opcode in program.opcodes:
+
+        if opcode == CONSTANT or opcode == VARIABLE:
+            if opcode == CONSTANT:
+                value = next(constants)
+            else:
+                name = next(names)
+                if variables is None or name not in variables:
+                    stack.append(('fraction', float_bits, None, 0))
+                    work += 1
+                    continue
+                value = variables[name]
+            bits = size(value)
+            stack.append((kind(value), bits, value if bits <= known_bits else None, 0))
+            largest = max(largest, bits)
+            work += 1
+            continue
+
+        symbol = opcode_symbols[opcode]
+        arity = table[opcode][0]
+
+        if arity == 1:
+            x_kind, x_bits, x, depth = stack.pop() if stack else small
+            if symbol in transcendental:
+                # converting a big operand to a float reads all of it
+                operand = ('float', float_bits, None, depth + 1)
+                nesting = max(nesting, depth + 1)
+                work += 1 + x_bits / 64
+            else:
+                operand = (x_kind, x_bits, None if x is None else -x, depth)
+                work += 1 + x_bits / 64
+            stack.append(operand)
+            continue
+
+        if arity == 0:
+            continue
+
+        y_kind, y_bits, y, y_depth = stack.pop() if stack else small
+        x_kind, x_bits, x, x_depth = stack.pop() if stack else small
+        depth = max(x_depth, y_depth)
+
+        if symbol == '^':
+            result_kind, bits = estimate_power(x_kind, x_bits, x, y_kind, y_bits, y)
+        elif 'float' in (x_kind, y_kind):
+            result_kind, bits = 'float', float_bits
+        elif symbol in ('+', '-'):
+            if x_kind == 'int' and y_kind == 'int':
+                result_kind, bits = 'int', max(x_bits, y_bits) + 1
+            else:
+                result_kind, bits = 'fraction', x_bits + y_bits
+        else:
+            result_kind = 'int' if symbol == '*' and x_kind == 'int' and y_kind == 'int' else 'fraction'
+            bits = x_bits + y_bits
+
+        # compute small values, so powers of them (and their results) are bounded exactly
+        value = None
+        if x is not None and y is not None and bits <= known_bits:
+            try:
+                value = table[opcode][1](x, y)
+            except Exception:
+                value = None
+            if value is not None:
+                result_kind = kind(value)
+                bits = size(value)
+                if bits > known_bits:
+                    value = None
+
+        words = bits / 64 + 1
+        if result_kind == 'float':
+            work += 1
+        elif symbol in ('+', '-') and result_kind == 'int':
+            work += words
+        else:
+            # multiplication is about words^1.6 (Karatsuba), and fractions also take a gcd
+            work += words ** 2 if result_kind == 'fraction' else words ** 1.6
+
+        largest = max(largest, bits)
+        stack.append((result_kind, bits, value, depth))
+
+    return Cost(len(program), nesting, largest, work)
+
+def estimate_power(x_kind, x_bits, x, y_kind, y_bits, y):
+    """
+    Estimates the kind and size of x^y in exact mode (see exact_power).
+
+        Returns:
+            kind (str): the kind of the result
+            bits (float): an upper bound on the size of the result, in bits (inf if unbounded)
+    """
+
+    # fractional exponents (or bases) are computed with floats, which overflow rather than grow
+    if x_kind == 'float' or y_kind != 'int':
+        return 'float', float_bits
+
+    if x is not None and x in (0, 1, -1):
+        return x_kind, 1
+
+    if y is not None:
+        exponent = abs(y)
+        result_kind = x_kind if y >= 0 else 'fraction'
+    else:
+        # the exponent is only known to be below 2^y_bits; past 2^1023 the bound is infinite
+        exponent = 2.0 ** y_bits if y_bits < 1024 else m.inf
+        result_kind = 'fraction'
+
+    return result_kind, max(x_bits * exponent, 1)
+
+def estimate_float_cost(program):
+    """Estimates the cost of a float mode program: every operation takes about the same time."""
+
+    nesting = 0
+    depths = []
+
+    for opcode in program.opcodes:
+        if opcode == CONSTANT or opcode == VARIABLE:
+            depths.append(0)
+            continue
+        arity = dispatch_table[opcode][0]
+        if arity == 1:
+            depth = depths.pop() if depths else 0
+            if opcode_symbols[opcode] in transcendental:
+                depth += 1
+                nesting = max(nesting, depth)
+            depths.append(depth)
+        elif arity == 2:
+            y = depths.pop() if depths else 0
+            x = depths.pop() if depths else 0
+            depths.append(max(x, y))
+
+    return Cost(len(program), nesting, float_bits, len(program))
+
+class ResourceGuard:
+    """A class which decides, from its static cost estimate, whether a program may run
+       (see the module docstring). Budgets of None are not checked."""
+
+    def __init__(self, max_nodes=100000, max_nesting=1000, max_bits=1 << 22, max_work=5e7,
+                 fast_bits=4096, fast_work=1e4):
+        """
+        Parameters:
+            max_nodes (int): the most operands and operators in a program
+            max_nesting (int): the deepest nesting of transcendental calls
+            max_bits (int): the largest size of any operand, in bits (memory)
+            max_work (float): the most machine word operations, roughly 20 ns each (CPU time)
+            fast_bits (int): the largest operand size of a program for the fast path
+            fast_work (float): the most work of a program for the fast path
+        """
+
+        self.max_nodes = max_nodes
+        self.max_nesting = max_nesting
+        self.max_bits = max_bits
+        self.max_work = max_work
+        self.fast_bits = fast_bits
+        self.fast_work = fast_work
+
+    def estimate(self, program, variables=None, key=None):
+        """
+        Returns the cost estimate of a program, cached under key if there are no variables.
+
+            Parameters:
+                program (Program): the mathematical expression in compact postfix form
+                variables (dict): the value of each variable in the expression (optional)
+                key: the cache key, e.g. (mode, infix expression) (optional, not cached without one)
+
+            Returns:
+                cost (Cost): the estimate
+        """
+
+        if key is None or variables:
+            return estimate_cost(program, variables)
+        cost = cost_cache.get(key)
+        if cost is None:
+            cost = estimate_cost(program)
+            cost_cache.put(key, cost)
+        return cost
+
+    def classify(self, program, variables=None, key=None):
+        """
+        Decides how a program may run.
+
+            Parameters:
+                program (Program): the mathematical expression in compact postfix form
+                variables (dict): the value of each variable in the expression (optional)
+                key: the cache key of the estimate (see estimate)
+
+            Returns:
+                decision (str): FAST if it is cheap, SLOW if it is within the budgets, or REJECT
+        """
+
+        # a float program costs about one unit of work per node whatever it computes, so its
+        # length bounds every budget (nesting too) without walking it
+        if program.mode == 'float':
+            nodes = len(program)
+            bound = Cost(nodes, nodes, float_bits, nodes)
+            if not self.over_budget(bound):
+                return FAST if bound.work <= self.fast_work else SLOW
+
+        cost = self.estimate(program, variables, key)
+        if self.over_budget(cost):
+            return REJECT
+        if cost.bits <= self.fast_bits and cost.work <= self.fast_work:
+            return FAST
+        return SLOW
+
+    def over_budget(self, cost):
+        """Returns whether a cost estimate is over any of the budgets."""
+
+        return ((self.max_nodes is not None and cost.nodes > self.max_nodes) or
+                (self.max_nesting is not None and cost.nesting > self.max_nesting) or
+                (self.max_bits is not None and cost.bits > self.max_bits) or
+                (self.max_work is not None and cost.work > self.max_work))
+
+    def run(self, program, variables=None, key=None):
+        """
+        Evaluates a program unless it is over the budgets.
+
+            Parameters:
+                program (Program): the mathematical expression in compact postfix form
+                variables (dict): the value of each variable in the expression (optional)
+                key: the cache key of the estimate (see estimate)
+
+            Returns:
+                result (float, int or str): the result of Evaluate.run, or too_costly
+        """
+
+        if self.classify(program, variables, key) == REJECT:
+            return too_costly
+        return Evaluate.run(program, variables)
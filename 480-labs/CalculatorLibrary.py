@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+A program library: many parsed expressions saved as compact programs (see Program) in
+one versioned binary file, so a fresh process can run them without parsing them again.
+
+The library is opened through a read-only memory map. Looking an expression up
+(a hash table in the file) and getting its program copies nothing: the program's
+opcodes and float constants are memoryview slices of the map, which Evaluate.run reads
+directly. Every process that opens the same file shares its pages, so a pool of
+workers holds one copy of the library between them.
+
+    write_library('formulas.lib', expressions)
+    library = ProgramLibrary('formulas.lib')
+    result = Evaluate.run(library.get('2*(3+4)'))
+
+An installed library is consulted by Evaluate.convert_to_program (and the bytes path)
+before parsing, so the rest of the engine uses it without changes:
+
+    install_libraries(['formulas.lib'])
+
+The file is written for the operators and byte order of the machine building it, which
+are checked when it is opened; rebuild it if either changes (e.g. a new operator).
+
+Layout, in native byte order, each section aligned to 8 bytes:
+    header          magic, format version, mode, byte order, program count, hash table size,
+                    then the (offset, length) of each section, in the order of sections
+    operators       the operator symbols in opcode order (UTF-8)
+    index           8 uint64 per program: opcode start and end, constant start and end,
+                    name start and end, max_depth, well_formed
+    slots           the hash table of expressions: uint64 program number + 1 (0 is empty)
+    key_offsets     uint64 start of each expression in keys, and the end of the last
+    keys            the expressions (UTF-8)
+    name_offsets    uint64 start of each variable name in names, and the end of the last
+    names           the variable names (UTF-8)
+    name_indices    uint32 variable name number for each variable opcode
+    opcodes         one byte per token
+    constants       float mode: a double per constant. exact mode: the text of each (see encode_constant)
+    constant_offsets  exact mode: uint64 start of each constant in constants, and the end of the last
+"""
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+from CalculatorEngine import Evaluate, Program, opcode_symbols, program_libraries
+
+"""The first bytes of every program library file."""
+magic = b'CALCLIB\x00'
+
+"""The version of the file layout: bump it when the layout changes, so old files are refused."""
+format_version = 1
+
+"""The sections of the file, in the order of the header's section table."""
+sections = ('operators', 'index', 'slots', 'key_offsets', 'keys', 'name_offsets', 'names',
+            'name_indices', 'opcodes', 'constants', 'constant_offsets')
+
+"""The header: magic, format version, mode (0 float, 1 exact), byte order (0 little, 1 big),
+   program count, hash table size, and an (offset, length) pair for each section."""
+header = struct.Struct('=8sIBB2xQQ' + 'QQ' * len(sections))
+
+"""The number of uint64 fields of each program in the index."""
+index_fields = 8
+
+"""The operator symbols, in opcode order, a library must have been built with."""
+operator_symbols = ''.join(opcode_symbols[2:]).encode()
+
+def encode_constant(value):
+    """Returns the text of an exact mode constant (integers are hexadecimal, so any size fits)."""
+
+    if type(value) is int:
+        return hex(value)
+    if type(value) is float:
+        return value.hex()
+    return f"{hex(value.numerator)}/{hex(value.denominator)}"
+
+def decode_constant(text):
+    """Returns the exact mode constant written as text (see encode_constant)."""
+
+    if '/' in text:
+        from fractions import Fraction
+        numerator, denominator = text.split('/')
+        return Fraction(int(numerator, 16), int(denominator, 16))
+    if 'p' in text:
+        return float.fromhex(text)
+    return int(text, 16)
+
+def align(buffer):
+    """Pads a bytearray with zeros to a multiple of 8 bytes."""
+    buffer.extend(bytes(-len(buffer) % 8))
+
+def write_library(path, expressions, mode='float'):
+    """
+    Parses expressions and saves their programs as a program library. The file is written
+    beside path then renamed over it, so processes which have the old one open keep reading it.
+    Expressions which can't be parsed are left out (parsing them again fails the same way).
+
+        Parameters:
+            path (str): the file to write
+            expressions (iterable of str): the mathematical expressions in infix notation
+            mode (str): the numeric mode (see numeric_modes)
+
+        Returns:
+            count (int): the number of programs written
+    """
+
+    keys = []
+    programs = []
+    for expression in dict.fromkeys(expressions):
+        try:
+            program = Program.from_postfix(Evaluate.parse(expression, mode), mode)
+        except Exception:
+            continue
+        keys.append(expression.encode())
+        programs.append(program)
+
+    index = array('Q')
+    opcodes = bytearray()
+    constants = array('d') if mode == 'float' else []
+    name_numbers = {}
+    name_indices = array('I')
+    for program in programs:
+        index.extend((len(opcodes), len(opcodes) + len(program.opcodes),
+                      len(constants), len(constants) + len(program.constants),
+                      len(name_indices), len(name_indices) + len(program.names),
+                      program.max_depth, program.well_formed))
+        opcodes.extend(program.opcodes)
+        constants.extend(program.constants)
+        name_indices.extend(name_numbers.setdefault(name, len(name_numbers)) for name in program.names)
+
+    # open addressing with linear probing, at most half full
+    slot_count = 1
+    while slot_count < 2 * len(keys):
+        slot_count *= 2
+    slots = array('Q', bytes(8 * slot_count))
+    for number, key in enumerate(keys):
+        slot = zlib.crc32(key) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = number + 1
+
+    def string_table(strings):
+        offsets = array('Q', [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        return offsets.tobytes(), b''.join(strings)
+
+    key_offsets, key_bytes = string_table(keys)
+    name_offsets, name_bytes = string_table([name.encode() for name in name_numbers])
+    if mode == 'float':
+        constant_bytes, constant_offsets = constants.tobytes(), b''
+    else:
+        constant_offsets, constant_bytes = string_table([encode_constant(value).encode() for value in constants])
+
+    contents = {'operators': operator_symbols, 'index': index.tobytes(), 'slots': slots.tobytes(),
+                'key_offsets': key_offsets, 'keys': key_bytes, 'name_offsets': name_offsets, 'names': name_bytes,
+                'name_indices': name_indices.tobytes(), 'opcodes': bytes(opcodes),
+                'constants': constant_bytes, 'constant_offsets': constant_offsets}
+
+    body = bytearray()
+    table = []
+    for section in sections:
+        table.extend((header.size + len(body), len(contents[section])))
+        body.extend(contents[section])
+        align(body)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(header.pack(magic, format_version, 0 if mode == 'float' else 1,
+                               0 if sys.byteorder == 'little' else 1, len(keys), slot_count, *table))
+        file.write(body)
+    os.replace(temporary, path)
+    return len(keys)
+
+class ProgramLibrary:
+    """A class which runs programs from a program library file through a read-only memory map
+       (see the module docstring). It is safe to share between threads."""
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): the program library file (see write_library)
+        """
+
+        import mmap
+
+        self.path = path
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < header.size:
+                raise Exception(f"not a program library: {path}")
+            self._mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = header.unpack_from(self._mapped)
+        file_magic, version, mode, byte_order, self.count, self.slot_count = fields[:6]
+        if file_magic != magic:
+            self._mapped.close()
+            raise Exception(f"not a program library: {path}")
+        if byte_order != (0 if sys.byteorder == 'little' else 1):
+            self._mapped.close()
+            raise Exception(f"program library {path} was written in the other byte order, rebuild it")
+        if version != format_version:
+            self._mapped.close()
+            raise Exception(f"program library {path} is format version {version}, expected {format_version}, rebuild it")
+        self.mode = 'float' if mode == 0 else 'exact'
+
+        view = self._view = memoryview(self._mapped)
+        parts = {}
+        for number, section in enumerate(sections):
+            offset, length = fields[6 + 2 * number:8 + 2 * number]
+            if offset + length > len(view):
+                self.close()
+                raise Exception(f"program library {path} is truncated")
+            parts[section] = view[offset:offset + length]
+
+        if parts['operators'] != operator_symbols:
+            self.close()
+            raise Exception(f"program library {path} was built for other operators, rebuild it")
+
+        self._index = parts['index'].cast('Q')
+        self._slots = parts['slots'].cast('Q')
+        self._key_offsets = parts['key_offsets'].cast('Q')
+        self._keys = parts['keys']
+        self._name_indices = parts['name_indices'].cast('I')
+        self._opcodes = parts['opcodes']
+
+        # the names are few and shared by many programs, so they are decoded once
+        name_offsets = parts['name_offsets'].cast('Q')
+        names = bytes(parts['names']).decode()
+        self._names = tuple(names[name_offsets[number]:name_offsets[number + 1]]
+                            for number in range(len(name_offsets) - 1))
+
+        if self.mode == 'float':
+            self._constants = parts['constants'].cast('d')
+        else:
+            self._constants = parts['constants']
+            self._constant_offsets = parts['constant_offsets'].cast('Q')
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, expression):
+        return self.find(expression) is not None
+
+    def __iter__(self):
+        return (self.expression(number) for number in range(self.count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def find(self, expression):
+        """
+        Looks an expression up in the library's hash table.
+
+            Parameters:
+                expression (str or bytes-like): the mathematical expression in infix notation
+
+            Returns:
+                number (int): the number of its program in the library (None if it isn't there)
+        """
+
+        if type(expression) is str:
+            try:
+                expression = expression.encode()
+            except UnicodeEncodeError:
+                return None
+
+        slots = self._slots
+        mask = self.slot_count - 1
+        slot = zlib.crc32(expression) & mask
+        while True:
+            number = slots[slot] - 1
+            if number < 0:
+                return None
+            if self._keys[self._key_offsets[number]:self._key_offsets[number + 1]] == expression:
+                return number
+            slot = (slot + 1) & mask
+
+    def expression(self, number):
+        """Returns the infix expression of the program with this number."""
+
+        return bytes(self._keys[self._key_offsets[number]:self._key_offsets[number + 1]]).decode()
+
+    def program(self, number):
+        """
+        Returns the program with this number, reading its opcodes and float constants from the map.
+
+            Parameters:
+                number (int): the number of the program in the library (0 to len - 1)
+
+            Returns:
+                program (Program): the mathematical expression in compact postfix form
+        """
+
+        if not 0 <= number < self.count:
+            raise IndexError("program library index out of range")
+
+        start = number * index_fields
+        (opcode_start, opcode_end, constant_start, constant_end,
+         name_start, name_end, max_depth, well_formed) = self._index[start:start + index_fields]
+
+        if self.mode == 'float':
+            constants = self._constants[constant_start:constant_end]
+        else:
+            offsets = self._constant_offsets
+            constants = [decode_constant(bytes(self._constants[offsets[position]:offsets[position + 1]]).decode())
+                         for position in range(constant_start, constant_end)]
+
+        names = ()
+        if name_start != name_end:
+            names = tuple(self._names[position] for position in self._name_indices[name_start:name_end])
+        return Program(self._opcodes[opcode_start:opcode_end], constants, names,
+                       max_depth, bool(well_formed), self.mode)
+
+    def get(self, expression, mode=None):
+        """
+        Returns the program of an expression, without parsing it.
+
+            Parameters:
+                expression (str or bytes-like): the mathematical expression in infix notation
+                mode (str): the numeric mode wanted (optional, None accepts the library's)
+
+            Returns:
+                program (Program): the mathematical expression in compact postfix form
+                                   (None if it isn't in the library, or the library is another mode)
+        """
+
+        if mode is not None and mode != self.mode:
+            return None
+        number = self.find(expression)
+        return None if number is None else self.program(number)
+
+    def install(self):
+        """Makes Evaluate.convert_to_program take programs from this library before parsing."""
+
+        if self not in program_libraries:
+            program_libraries.append(self)
+        return self
+
+    def uninstall(self):
+        """Stops Evaluate.convert_to_program taking programs from this library (cached ones stay cached)."""
+
+        if self in program_libraries:
+            program_libraries.remove(self)
+
+    def close(self):
+        """
+        Unmaps the file. Programs still in use (e.g. in program_cache) keep the map
+        open until they are gone; uninstall the library and invalidate the cache first
+        to release it at once.
+        """
+
+        self.uninstall()
+        for name in ('_index', '_slots', '_key_offsets', '_keys', '_name_indices', '_opcodes',
+                     '_constants', '_constant_offsets', '_view'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        try:
+            self._mapped.close()
+        except BufferError:
+            pass
+
+def install_libraries(paths):
+    """
+    Opens program libraries and installs them (see ProgramLibrary.install), e.g. as the
+    initializer of a pool of worker processes, so each maps the files once at start up.
+
+        Parameters:
+            paths (iterable of str): the program library files
+
+        Returns:
+            libraries (list of ProgramLibrary): the libraries opened
+    """
+
+    return [ProgramLibrary(path).install() for path in paths]
+
+def main(argv=None):
+    """The main method. Builds a program library, or describes one."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a program library of parsed expressions, "
+                                                 "which the calculator can run without parsing them (see --library).")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="parse one expression per line from files into a library")
+    build.add_argument('library', help="the library file to write")
+    build.add_argument('files', nargs='+', help="files of expressions ('-' for standard input)")
+    build.add_argument('--exact', action='store_true', help="parse for exact mode")
+    info = commands.add_parser('info', help="describe a library")
+    info.add_argument('library', help="the library file to read")
+    info.add_argument('--list', action='store_true', help="also print every expression")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'build':
+            def lines():
+                for name in args.files:
+                    with (open(sys.stdin.fileno(), closefd=False) if name == '-' else open(name)) as file:
+                        for line in file:
+                            line = line.strip()
+                            if line:
+                                yield line
+            expressions = list(dict.fromkeys(lines()))
+            count = write_library(args.library, expressions, 'exact' if args.exact else 'float')
+            print(f"{count} programs written to {args.library} "
+                  f"({len(expressions) - count} expressions could not be parsed)", file=sys.stderr)
+        else:
+            with ProgramLibrary(args.library) as library:
+                print(f"{library.path}: {len(library)} {library.mode} mode programs, "
+                      f"format version {format_version}, {os.path.getsize(library.path)} bytes")
+                if args.list:
+                    for expression in library:
+                        print(expression)
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
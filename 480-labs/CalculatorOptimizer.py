@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+An optimizer for postfix programs, run between Evaluate.convert_to_postfix and evaluation.
+
+The program is turned into an expression DAG, in which identical subexpressions are
+stored once, and then simplified by a series of passes. Every default pass keeps the
+results of Evaluate.evaluate exactly, including which error is reported first; the
+algebraic passes also simplify what is only equal up to rounding.
+
+Installing an optimizer makes Evaluate.convert_to_program run it over each float mode
+expression it parses (Calculator.py --optimize):
+
+    Optimizer().install()
+"""
+
+import math as m
+import time
+from CalculatorEngine import Stack, Evaluate, operators, free_variables, inline_operators, program_cache, program_optimizers
+
+"""The symbol of constant nodes in a Dag."""
+CONSTANT = '#'
+
+class Dag:
+    """A class which holds an expression as a directed acyclic graph.
+       Each node is stored once (hash-consing), after the nodes it uses,
+       in the order they are first evaluated."""
+
+    def __init__(self):
+        # a (symbol, operands, value) tuple for each node,
+        # where operands are node numbers and value is only used by constants
+        self.nodes = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, symbol, operands=(), value=None):
+        """
+        Returns the node for an operation, adding it only if it isn't in the graph yet.
+
+            Parameters:
+                symbol (str): CONSTANT, a variable or an operator symbol
+                operands (tuple of int): the nodes the operator is applied to
+                value (float): the value of a constant
+
+            Returns:
+                node (int): the node number
+        """
+
+        # 0.0 and -0.0 are equal but different constants
+        key = (symbol, operands, value, m.copysign(1.0, value) if type(value) == float else None)
+        node = self.index.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.nodes.append((symbol, operands, value))
+            self.index[key] = node
+        return node
+
+    def constant(self, node):
+        """Returns whether a node is a constant."""
+        return self.nodes[node][0] == CONSTANT
+
+    def value(self, node):
+        """Returns the value of a constant node."""
+        return self.nodes[node][2]
+
+    def reachable(self, root):
+        """
+        Returns the nodes used to compute a root node, in evaluation order.
+
+            Parameters:
+                root (int): the node of the whole expression
+
+            Returns:
+                nodes (list of int): the nodes, root last
+        """
+
+        used = [False] * len(self.nodes)
+        used[root] = True
+        for node in range(root, -1, -1):
+            if used[node]:
+                for operand in self.nodes[node][1]:
+                    used[operand] = True
+        return [node for node in range(root + 1) if used[node]]
+
+    @staticmethod
+    def from_postfix(postfix_expression: Stack):
+        """
+        Builds the graph of a postfix expression.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+
+            Returns:
+                dag (Dag): the graph
+                root (int): the node of the whole expression
+        """
+
+        dag = Dag()
+        operand_stack = []
+
+        for symbol in postfix_expression.array:
+            if type(symbol) == int or type(symbol) == float:
+                operand_stack.append(dag.add(CONSTANT, value=symbol))
+            elif symbol in free_variables or symbol[0] == '[':
+                operand_stack.append(dag.add(symbol))
+            elif symbol not in operators:
+                raise Exception("invalid operator: postfix evaluation")
+            elif symbol == '(' or symbol == ')':
+                continue
+            else:
+                arity = 1 if operators[symbol].is_unary else 2
+                if len(operand_stack) < arity:
+                    raise Exception("postfix evaluation exception: missing operands")
+                operands = tuple(operand_stack[-arity:])
+                del operand_stack[-arity:]
+                operand_stack.append(dag.add(symbol, operands))
+
+        if len(operand_stack) != 1:
+            raise Exception("postfix evaluation exception: operands remaining")
+
+        return dag, operand_stack[0]
+
+    def to_postfix(self, root) -> Stack:
+        """
+        Writes out the expression of a node as a postfix stack (shared nodes are repeated).
+
+            Parameters:
+                root (int): the node of the whole expression
+
+            Returns:
+                postfix_stack (Stack): the mathematical expression in postfix notation,
+                               contained in a stack structure
+        """
+
+        postfix_stack = Stack()
+
+        # nodes still to write, operands first (a node marked True has had its operands written)
+        pending = [(root, False)]
+        while pending:
+            node, expanded = pending.pop()
+            symbol, operands, value = self.nodes[node]
+            if symbol == CONSTANT:
+                postfix_stack.push(value)
+            elif expanded or not operands:
+                postfix_stack.push(symbol)
+            else:
+                pending.append((node, True))
+                for operand in reversed(operands):
+                    pending.append((operand, False))
+        return postfix_stack
+
+def fold_constants(dag, symbol, operands, value):
+    """
+    A rewrite rule which computes operators whose operands are all constants,
+    unless that would give an error (the error is left for evaluation to report).
+    """
+
+    if symbol == CONSTANT or not operands or not all(dag.constant(operand) for operand in operands):
+        return None
+
+    values = [dag.value(operand) for operand in operands]
+
+    # don't fold log or square root of negative, or divide by zero
+    if symbol in ('l', 'n', 'q') and values[0] < 0:
+        return None
+    if symbol == '/' and values[1] == 0:
+        return None
+
+    try:
+        result = operators[symbol].func(*values)
+    except Exception:
+        return None
+
+    # complex results (negative to a fractional power) are left as they are
+    if type(result) != float:
+        return None
+    return dag.add(CONSTANT, value=result)
+
+def remove_double_negation(dag, symbol, operands, value):
+    """A rewrite rule which replaces ~~x with x."""
+
+    if symbol == '~' and dag.nodes[operands[0]][0] == '~':
+        return dag.nodes[operands[0]][1][0]
+    return None
+
+def remove_identities(dag, symbol, operands, value):
+    """A rewrite rule which replaces x*1, 1*x, x/1 and x^1 with x."""
+
+    if symbol == '*':
+        if dag.constant(operands[1]) and dag.value(operands[1]) == 1:
+            return operands[0]
+        if dag.constant(operands[0]) and dag.value(operands[0]) == 1:
+            return operands[1]
+    elif symbol in ('/', '^'):
+        if dag.constant(operands[1]) and dag.value(operands[1]) == 1:
+            return operands[0]
+    return None
+
+def remove_reciprocal_pairs(dag, symbol, operands, value):
+    """
+    A rewrite rule which replaces (x^-1)^-1 (the i button pressed twice on a parenthesized x) with x,
+    for any x, so a chain of reciprocals leaves at most one. This is an algebraic pass: 1/(1/x) can
+    differ from x in the last digit (e.g. for 49), and is an error where x is 0.
+    """
+
+    if symbol == '^' and dag.constant(operands[1]) and dag.value(operands[1]) == -1:
+        inner, inner_operands, _ = dag.nodes[operands[0]]
+        if inner == '^' and dag.constant(inner_operands[1]) and dag.value(inner_operands[1]) == -1:
+            return inner_operands[0]
+    return None
+
+class Optimizer:
+    """A class which simplifies postfix programs by running rewrite passes over their DAG.
+       Statistics for each pass of the last run are kept in stats."""
+
+    """The passes run by default, in order: a name and a rewrite rule for each."""
+    default_passes = (('fold', fold_constants),
+                      ('negation', remove_double_negation),
+                      ('identity', remove_identities))
+
+    """The default passes, then passes which only keep results up to rounding (and may remove an error)."""
+    algebraic_passes = default_passes + (('reciprocal', remove_reciprocal_pairs),)
+
+    def __init__(self, passes=default_passes):
+        self.passes = passes
+        self.stats = {}
+
+    def optimize(self, postfix_expression: Stack):
+        """
+        Builds the DAG of a postfix expression and runs each pass over it.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+
+            Returns:
+                dag (Dag): the simplified graph
+                root (int): the node of the whole expression
+        """
+
+        self.stats = {}
+
+        start = time.perf_counter()
+        dag, root = Dag.from_postfix(postfix_expression)
+        self.stats['cse'] = {'tokens': len(postfix_expression.array), 'nodes': len(dag.reachable(root)),
+                             'seconds': time.perf_counter() - start}
+
+        for name, rule in self.passes:
+            start = time.perf_counter()
+            nodes_before = len(dag.reachable(root))
+            dag, root, rewrites = Optimizer.rewrite(dag, root, rule)
+            self.stats[name] = {'rewrites': rewrites, 'nodes_before': nodes_before,
+                                'nodes_after': len(dag.reachable(root)),
+                                'seconds': time.perf_counter() - start}
+
+        return dag, root
+
+    @staticmethod
+    def rewrite(dag, root, rule):
+        """
+        Rebuilds a graph bottom-up, applying a rewrite rule to each node.
+
+            Parameters:
+                dag (Dag): the graph
+                root (int): the node of the whole expression
+                rule (function): takes the new graph and a node's symbol, (new) operands and value,
+                                 returns the node to use instead, or None to keep it
+
+            Returns:
+                dag (Dag): the new graph
+                root (int): the node of the whole expression in the new graph
+                rewrites (int): the number of nodes the rule replaced
+        """
+
+        new_dag = Dag()
+        new_node = {}
+        rewrites = 0
+
+        # operands come before the nodes using them, so they are always rebuilt first
+        for node in dag.reachable(root):
+            symbol, operands, value = dag.nodes[node]
+            operands = tuple(new_node[operand] for operand in operands)
+            replacement = rule(new_dag, symbol, operands, value)
+            if replacement is None:
+                replacement = new_dag.add(symbol, operands, value)
+            else:
+                rewrites += 1
+            new_node[node] = replacement
+
+        return new_dag, new_node[root], rewrites
+
+    def optimize_postfix(self, postfix_expression: Stack) -> Stack:
+        """
+        Simplifies a postfix expression. Malformed expressions are returned unchanged.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+
+            Returns:
+                postfix_stack (Stack): the simplified expression in postfix notation
+        """
+
+        try:
+            dag, root = self.optimize(postfix_expression)
+        except Exception:
+            return postfix_expression
+        return dag.to_postfix(root)
+
+    def install(self):
+        """Makes Evaluate.convert_to_program run this optimizer over each float mode expression it parses."""
+
+        if self not in program_optimizers:
+            program_optimizers.append(self)
+            # programs cached before are unoptimized
+            program_cache.invalidate()
+        return self
+
+    def uninstall(self):
+        """Stops Evaluate.convert_to_program running this optimizer."""
+
+        if self in program_optimizers:
+            program_optimizers.remove(self)
+            program_cache.invalidate()
+
+    def compile(self, postfix_expression: Stack):
+        """
+        Simplifies a postfix expression and compiles it into a Python function
+        (see Evaluate.compile), computing each shared subexpression only once.
+
+            Parameters:
+                postfix_expression (Stack): the mathematical expression in postfix notation
+                                            contained in a Stack structure
+
+            Returns:
+                program (function): a function taking the variables dictionary (optional)
+                                    which returns the result of the mathematical expression
+        """
+
+        # malformed programs are left to Evaluate.compile
+        try:
+            dag, root = self.optimize(postfix_expression)
+        except Exception:
+            return Evaluate.compile(postfix_expression)
+
+        return compile_dag(dag, root)
+
+def compile_dag(dag, root):
+    """
+    Compiles the expression of a DAG node into a Python function (see Evaluate.compile).
+
+        Parameters:
+            dag (Dag): the graph
+            root (int): the node of the whole expression
+
+        Returns:
+            program (function): a function taking the variables dictionary (optional)
+                                which returns the result of the mathematical expression
+    """
+
+    # names available to the generated code
+    namespace = {'_sin': m.sin, '_cos': m.cos, '_tan': m.tan,
+                 '_log10': m.log10, '_log': m.log, '_sqrt': m.sqrt}
+    lines = ['def _program(variables=None):']
+
+    # the name holding the value of each node
+    names = {}
+
+    for node in dag.reachable(root):
+        symbol, operands, value = dag.nodes[node]
+        name = f'_v{node}'
+
+        if symbol == CONSTANT:
+            namespace[name] = value
+
+        elif symbol in free_variables or symbol[0] == '[':
+            variable = symbol[1:-1] if symbol[0] == '[' else symbol
+            lines.append(f'    if variables is None or {variable!r} not in variables: '
+                         f'raise Exception("unbound variable: {variable}")')
+            lines.append(f'    {name} = float(variables[{variable!r}])')
+
+        else:
+            # use the template if there is one, otherwise call the operator's function
+            template = inline_operators.get(symbol)
+            if template is None:
+                namespace[f'_f{node}'] = operators[symbol].func
+                template = f'_f{node}' + ('({0})' if operators[symbol].is_unary else '({0}, {1})')
+            arguments = [names[operand] for operand in operands]
+
+            if operators[symbol].is_unary:
+                # don't allow log or square root of negative
+                if symbol in ('l', 'n', 'q'):
+                    lines.append(f'    if {arguments[0]} < 0: return {f"Domain Error: {operators[symbol].button_str}"!r}')
+                lines.append(f'    {name} = ' + template.format(*arguments))
+            else:
+                # don't allow divide by zero
+                if symbol == '/':
+                    lines.append(f'    if {arguments[1]} == 0: return "Error: Div by 0"')
+                lines.append('    try:')
+                lines.append(f'        {name} = ' + template.format(*arguments))
+                lines.append('    except OverflowError:')
+                lines.append('        return "Error: Overflow"')
+
+        names[node] = name
+
+    # return as an integer, if possible
+    result = names[root]
+    lines.append(f'    return int({result}) if {result}.is_integer() else {result}')
+
+    exec('\n'.join(lines), namespace)
+    return namespace['_program']
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+The graph view of the calculator: plots an expression in x on a Tk Canvas.
+
+Samples are placed adaptively, more where the curve bends, ends or jumps (such as the
+asymptotes of TAN) and fewer where it is flat, and each curve is reduced to at most
+four points per pixel column before it is drawn. Dragging pans the view by moving what
+is already drawn and sampling only the newly exposed strip; zooming rescales what is
+drawn at once and resamples once Tk is idle.
+"""
+
+import math as m
+import tkinter as tk
+from CalculatorEngine import Evaluate
+
+def make_function(infix_expression):
+    """
+    Compiles an expression into a function of x for plotting.
+
+        Parameters:
+            infix_expression (str): the mathematical expression in infix notation
+
+        Returns:
+            function (function): takes x (float), returns y (float), or None where
+                                 the expression is undefined (errors and complex results)
+    """
+
+    program = Evaluate.compile(Evaluate.convert_to_postfix(infix_expression))
+    variables = {'x': 0.0}
+
+    def function(x):
+        variables['x'] = x
+        try:
+            y = program(variables)
+        except Exception:
+            return None
+        # error messages and complex powers are gaps in the curve
+        if type(y) == str or type(y) == complex:
+            return None
+        y = float(y)
+        return y if m.isfinite(y) else None
+
+    return function
+
+def sample(function, x_min, x_max, x_scale, y_scale, tolerance=0.5, initial=64, max_samples=20000, jump=8):
+    """
+    Samples a function adaptively: each interval is halved until its midpoint is within
+    tolerance pixels of the straight line between its ends, or it is a quarter pixel wide.
+
+        Parameters:
+            function (function): takes x, returns y or None (see make_function)
+            x_min (float): the start of the range
+            x_max (float): the end of the range
+            x_scale (float): pixels per unit of x
+            y_scale (float): pixels per unit of y
+            tolerance (float): the largest allowed error, in pixels
+            initial (int): the number of equal intervals to start with
+            max_samples (int): the most times the function is called
+            jump (float): the smallest step, in pixels, within a quarter pixel that is a break in the curve
+
+        Returns:
+            points (list of tuple): (x, y) in order of x, where y is None at a gap or a jump
+    """
+
+    xs = [x_min + (x_max - x_min) * i / initial for i in range(initial + 1)]
+    ys = [function(x) for x in xs]
+    budget = max_samples - len(xs)
+    min_width = 0.25 / x_scale
+
+    points = [(xs[0], ys[0])]
+    for i in range(initial):
+        # depth first, left half on top, so points come out in order
+        pending = [(xs[i], ys[i], xs[i + 1], ys[i + 1])]
+        while pending:
+            x0, y0, x1, y1 = pending.pop()
+            xm = (x0 + x1) / 2
+            ym = function(xm)
+            budget -= 1
+            can_split = budget > 0 and x1 - x0 > min_width
+
+            if y0 is None or ym is None or y1 is None:
+                # split to find where the curve starts or ends
+                if can_split and not (y0 is None and ym is None and y1 is None):
+                    pending.append((xm, ym, x1, y1))
+                    pending.append((x0, y0, xm, ym))
+                    continue
+
+            elif abs(ym - (y0 + y1) / 2) * y_scale > tolerance:
+                if can_split:
+                    pending.append((xm, ym, x1, y1))
+                    pending.append((x0, y0, xm, ym))
+                    continue
+                # a big step which isn't monotonic even this close is a jump, not a slope
+                if not min(y0, y1) <= ym <= max(y0, y1) and abs(y1 - y0) * y_scale > jump:
+                    ym = None
+
+            points.append((xm, ym))
+            points.append((x1, y1))
+
+    return points
+
+def decimate(screen_points):
+    """
+    Reduces a polyline to at most four points per pixel column (the first, lowest,
+    highest and last), which draws the same pixels.
+
+        Parameters:
+            screen_points (list of tuple): (x, y) canvas coordinates, in order of x
+
+        Returns:
+            screen_points (list of tuple): the reduced polyline
+    """
+
+    reduced = []
+    column = None
+    first = low = high = last = None
+
+    def flush():
+        # keep the points of the column in their original order, each once
+        for index, point in sorted({first, low, high, last}):
+            reduced.append(point)
+
+    for index, point in enumerate(screen_points):
+        if m.floor(point[0]) != column:
+            if column is not None:
+                flush()
+            column = m.floor(point[0])
+            first = low = high = (index, point)
+        elif point[1] < low[1][1]:
+            low = (index, point)
+        elif point[1] > high[1][1]:
+            high = (index, point)
+        last = (index, point)
+    if column is not None:
+        flush()
+
+    return reduced
+
+class Plot:
+    """A class which shows the graph of an expression in x in its own window.
+       Drag to pan, scroll to zoom."""
+
+    def __init__(self, master, infix_expression, x_range=(-10.0, 10.0), width=480, height=360):
+        """
+        Parameters:
+            master (tk.Tk): the calculator window
+            infix_expression (str): the mathematical expression in infix notation
+            x_range (tuple of float): the range of x shown at first
+            width (int): the width of the canvas, in pixels
+            height (int): the height of the canvas, in pixels
+        """
+
+        self.function = make_function(infix_expression)
+
+        self.window = tk.Toplevel(master)
+        self.window.title("Plot: " + Evaluate.to_string(infix_expression))
+        self.canvas = tk.Canvas(self.window, width=width, height=height, bg='white', highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+        self.width = width
+        self.height = height
+
+        # the view, and the range of x sampled and drawn so far (panning extends it)
+        self.x_min, self.x_max = x_range
+        self.y_min, self.y_max = self.autoscale()
+        self.drawn_min = self.drawn_max = None
+
+        # how far the curve has been moved vertically since it was last sampled
+        self.y_shift = 0
+
+        # the number of function calls made by the last redraw (or pan)
+        self.samples = 0
+
+        self.pending_redraw = None
+        self.drag = None
+
+        self.canvas.bind('<ButtonPress-1>', self.start_drag)
+        self.canvas.bind('<B1-Motion>', self.drag_to)
+        self.canvas.bind('<ButtonRelease-1>', self.end_drag)
+        self.canvas.bind('<MouseWheel>', lambda event: self.zoom(event.x, event.y, 0.8 if event.delta > 0 else 1.25))
+        self.canvas.bind('<Button-4>', lambda event: self.zoom(event.x, event.y, 0.8))
+        self.canvas.bind('<Button-5>', lambda event: self.zoom(event.x, event.y, 1.25))
+        self.canvas.bind('<Configure>', self.resize)
+
+        self.redraw()
+
+    def autoscale(self):
+        """Returns a y range showing most of the curve over the current x range."""
+
+        ys = [self.function(self.x_min + (self.x_max - self.x_min) * i / 200) for i in range(201)]
+        ys = sorted(y for y in ys if y is not None)
+        if not ys:
+            return -10.0, 10.0
+
+        # leave out the extremes, so an asymptote doesn't flatten everything else
+        low, high = ys[len(ys) // 20], ys[-(len(ys) // 20) - 1]
+        if high - low < 1e-9:
+            low, high = low - 1, high + 1
+        padding = (high - low) * 0.1
+        return low - padding, high + padding
+
+    def scales(self):
+        """Returns the pixels per unit of x and of y."""
+        return self.width / (self.x_max - self.x_min), self.height / (self.y_max - self.y_min)
+
+    def to_screen(self, points):
+        """
+        Converts sampled points to canvas polylines, split at gaps and jumps and decimated.
+
+            Parameters:
+                points (list of tuple): (x, y) from sample
+
+            Returns:
+                polylines (list of list): the canvas coordinates of each piece of the curve
+        """
+
+        x_scale, y_scale = self.scales()
+        # far off-screen points are pulled in, so Tk's coordinates stay small
+        top, bottom = -4 * self.height, 5 * self.height
+
+        polylines = []
+        current = []
+        for x, y in points:
+            if y is None:
+                if len(current) > 1:
+                    polylines.append(decimate(current))
+                current = []
+                continue
+            py = (self.y_max - y) * y_scale
+            current.append(((x - self.x_min) * x_scale, min(max(py, top), bottom)))
+        if len(current) > 1:
+            polylines.append(decimate(current))
+        return polylines
+
+    def draw_curve(self, x_min, x_max):
+        """Samples and draws the curve between two values of x."""
+
+        calls = 0
+        def function(x):
+            nonlocal calls
+            calls += 1
+            return self.function(x)
+
+        x_scale, y_scale = self.scales()
+        initial = max(8, int((x_max - x_min) * x_scale) // 8)
+        points = sample(function, x_min, x_max, x_scale, y_scale, initial=initial)
+        # every call, including the midpoints which were split again rather than plotted
+        self.samples += calls
+
+        for polyline in self.to_screen(points):
+            self.canvas.create_line(*[coordinate for point in polyline for coordinate in point],
+                                    fill='#22223B', width=2, tags='curve')
+
+    def draw_axes(self):
+        """Redraws the axes and the labels of the view's corners."""
+
+        self.canvas.delete('axes')
+        x_scale, y_scale = self.scales()
+        if self.x_min <= 0 <= self.x_max:
+            px = -self.x_min * x_scale
+            self.canvas.create_line(px, 0, px, self.height, fill='#9A8C98', tags='axes')
+        if self.y_min <= 0 <= self.y_max:
+            py = self.y_max * y_scale
+            self.canvas.create_line(0, py, self.width, py, fill='#9A8C98', tags='axes')
+
+        self.canvas.create_text(4, self.height - 4, anchor='sw', text=f"{self.x_min:.4g}", tags='axes')
+        self.canvas.create_text(self.width - 4, self.height - 4, anchor='se', text=f"{self.x_max:.4g}", tags='axes')
+        self.canvas.create_text(4, 4, anchor='nw', text=f"{self.y_max:.4g}", tags='axes')
+        self.canvas.create_text(4, self.height - 20, anchor='sw', text=f"{self.y_min:.4g}", tags='axes')
+        self.canvas.tag_lower('axes')
+
+    def redraw(self):
+        """Samples and draws the whole view again."""
+
+        self.pending_redraw = None
+        self.samples = 0
+        self.canvas.delete('all')
+        self.draw_axes()
+        self.draw_curve(self.x_min, self.x_max)
+        self.drawn_min, self.drawn_max = self.x_min, self.x_max
+        self.y_shift = 0
+
+    def schedule_redraw(self):
+        """Redraws once Tk is idle, however many changes to the view come first."""
+
+        if self.pending_redraw is None:
+            self.pending_redraw = self.canvas.after_idle(self.redraw)
+
+    def start_drag(self, event):
+        self.drag = (event.x, event.y)
+
+    def drag_to(self, event):
+        """Pans the view: moves what is drawn, then samples only the strip that came into view."""
+
+        if self.drag is None:
+            return
+        dx, dy = event.x - self.drag[0], event.y - self.drag[1]
+        self.drag = (event.x, event.y)
+
+        x_scale, y_scale = self.scales()
+        self.x_min -= dx / x_scale
+        self.x_max -= dx / x_scale
+        self.y_min += dy / y_scale
+        self.y_max += dy / y_scale
+        self.canvas.move('curve', dx, dy)
+        self.y_shift += dy
+        self.draw_axes()
+
+        # a resample is already on its way
+        if self.pending_redraw is not None:
+            return
+
+        # sample a little past the edge, so small drags don't each need a strip
+        self.samples = 0
+        margin = (self.x_max - self.x_min) / 8
+        if self.x_min < self.drawn_min:
+            self.draw_curve(self.x_min - margin, self.drawn_min)
+            self.drawn_min = self.x_min - margin
+        if self.x_max > self.drawn_max:
+            self.draw_curve(self.drawn_max, self.x_max + margin)
+            self.drawn_max = self.x_max + margin
+
+    def end_drag(self, event):
+        """Finishes a pan, starting afresh if the curve drawn has grown much wider or taller than the view."""
+
+        self.drag = None
+        width = self.x_max - self.x_min
+        if self.drawn_max - self.drawn_min > 3 * width or abs(self.y_shift) > 3 * self.height:
+            self.schedule_redraw()
+
+    def zoom(self, x, y, factor):
+        """
+        Zooms the view about a point of the canvas.
+
+            Parameters:
+                x (int): the canvas x coordinate to keep still
+                y (int): the canvas y coordinate to keep still
+                factor (float): the new size of the view relative to the old one
+        """
+
+        x_scale, y_scale = self.scales()
+        x_value = self.x_min + x / x_scale
+        y_value = self.y_max - y / y_scale
+        self.x_min = x_value - (x_value - self.x_min) * factor
+        self.x_max = x_value + (self.x_max - x_value) * factor
+        self.y_min = y_value - (y_value - self.y_min) * factor
+        self.y_max = y_value + (self.y_max - y_value) * factor
+
+        # show the old curve at the new scale now, and resample when idle
+        self.canvas.scale('curve', x, y, 1 / factor, 1 / factor)
+        self.draw_axes()
+        self.schedule_redraw()
+
+    def resize(self, event):
+        """Keeps the view filling the canvas when the window is resized."""
+
+        if (event.width, event.height) == (self.width, self.height):
+            return
+        self.width, self.height = event.width, event.height
+        self.schedule_redraw()
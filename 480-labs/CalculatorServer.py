@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+A local evaluation service: an asyncio server which evaluates expressions sent over
+TCP or a Unix socket, so many programs can share one warm program cache.
+
+Each request is one line, either an internal expression string, answered with one
+line as in the command line mode, or a JSON object, answered with a JSON object:
+
+    {"id": 1, "expression": "2*x+1", "variables": {"x": 3}, "mode": "float"}
+    {"id": 1, "result": 7, "code": 0}
+
+Requests may be pipelined: a client can send many lines without waiting, and the
+answers come back in the same order. Requests from all connections are batched
+and evaluated in a bounded pool; when the pool is busy the server stops reading,
+which slows the clients down instead of queueing without limit.
+
+Each program's cost is estimated before it runs (see CalculatorGuard): cheap ones run
+in their batch, costly ones are moved to a separate slow lane so they can't hold up
+the rest, and ones over the budgets (or past a full slow lane) are answered with
+"Error: Too Costly" without running.
+
+    python CalculatorServer.py --port 8765
+    python CalculatorServer.py --unix /tmp/calculator.sock --processes
+"""
+
+import asyncio
+import json
+import math
+import os
+import sys
+from CalculatorEngine import Evaluate, INVALID, TOO_COSTLY
+from CalculatorGuard import ResourceGuard, SLOW, REJECT, too_costly
+
+def evaluate_requests(requests, guard=None, lane='fast'):
+    """
+    Evaluates a batch of requests (the unit of work sent to the pool).
+
+        Parameters:
+            requests (list of tuple): an (expression, mode, variables) tuple for each request
+            guard (ResourceGuard): the budgets to check each program against (optional)
+            lane (str): 'fast' leaves requests the guard finds costly for the slow lane,
+                        'slow' evaluates them (they have already been checked)
+
+        Returns:
+            results (list): a (result, error code) tuple for each request, in order.
+                            When the code is INVALID the result is the exception message,
+                            and when both are None the request is for the slow lane.
+    """
+
+    results = []
+    for expression, mode, variables in requests:
+        try:
+            program = Evaluate.convert_to_program(expression, mode)
+            if guard is not None and lane == 'fast':
+                decision = guard.classify(program, variables, (mode, expression))
+                if decision == SLOW:
+                    results.append((None, None))
+                    continue
+                if decision == REJECT:
+                    results.append((too_costly, TOO_COSTLY))
+                    continue
+            result = Evaluate.run(program, variables)
+        except Exception as error:
+            results.append((str(error), INVALID))
+        else:
+            results.append((result, Evaluate.error_code(result)))
+    return results
+
+class Batcher:
+    """A class which collects requests into batches and evaluates them in a pool.
+       At most max_pending batches are in the pool at once; submit waits for a free slot.
+       With a guard, costly requests are evaluated one at a time in the slow executor,
+       and at most max_slow of them wait there; the rest are rejected."""
+
+    def __init__(self, executor, batch_size=64, batch_delay=0.001, max_pending=8,
+                 guard=None, slow_executor=None, max_slow=64):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.slots = asyncio.Semaphore(max_pending)
+        self.pending = []
+        self.timer = None
+        self.guard = guard
+        self.slow_executor = slow_executor
+        self.max_slow = max_slow
+        self.slow_pending = 0
+
+    async def submit(self, request):
+        """
+        Adds a request to the next batch.
+
+            Parameters:
+                request (tuple): an (expression, mode, variables) tuple
+
+            Returns:
+                future (asyncio.Future): set to the (result, error code) tuple once evaluated
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((request, future))
+
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self.timer is None:
+            # send a partial batch if no more requests arrive soon
+            self.timer = loop.call_later(self.batch_delay, lambda: asyncio.ensure_future(self.flush()))
+        return future
+
+    async def flush(self):
+        """Sends the pending requests to the pool, waiting while the pool is full."""
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        await self.slots.acquire()
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.executor, evaluate_requests, [request for request, _ in batch],
+                                    self.guard, 'fast')
+        work.add_done_callback(lambda work: self.deliver(batch, work))
+
+    def deliver(self, batch, work, lane='fast'):
+        """Sets the future of each request in a finished batch, and sends those left for the slow lane there."""
+
+        if lane == 'fast':
+            self.slots.release()
+        error = work.exception() if not work.cancelled() else asyncio.CancelledError()
+        results = work.result() if error is None else [None] * len(batch)
+        for (request, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif result[1] is None:
+                self.send_slow(request, future)
+            else:
+                future.set_result(result)
+
+    def send_slow(self, request, future):
+        """Evaluates one costly request in the slow executor, or rejects it if too many are waiting."""
+
+        if self.slow_executor is None or self.slow_pending >= self.max_slow:
+            future.set_result((too_costly, TOO_COSTLY))
+            return
+
+        self.slow_pending += 1
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.slow_executor, evaluate_requests, [request], self.guard, 'slow')
+
+        def done(work):
+            self.slow_pending -= 1
+            self.deliver([(request, future)], work, 'slow')
+        work.add_done_callback(done)
+
+def parse_request(line):
+    """
+    Reads one request line.
+
+        Parameters:
+            line (bytes): the line, without its newline
+
+        Returns:
+            request (tuple): an (expression, mode, variables) tuple
+            request_id: the id of a JSON request (None for plain text)
+            is_json (bool): whether the request was JSON, and so wants a JSON answer
+    """
+
+    if not line.startswith(b'{'):
+        return (line.decode(), 'float', None), None, False
+
+    message = json.loads(line)
+    if type(message) != dict or type(message.get('expression')) != str:
+        raise Exception("a JSON request needs an \"expression\" string")
+    return (message['expression'], message.get('mode', 'float'), message.get('variables')), message.get('id'), True
+
+def format_response(result, code, request_id, is_json):
+    """
+    Writes the answer to one request.
+
+        Parameters:
+            result (float, int, Fraction or str): the result, or the error message
+            code (int): the error code (see Evaluate.error_code)
+            request_id: the id of a JSON request
+            is_json (bool): whether to answer with JSON
+
+        Returns:
+            line (bytes): the answer, with its newline
+    """
+
+    try:
+        if not is_json:
+            # some parser messages already say they are errors
+            if code == INVALID and not result.startswith('Error'):
+                result = f"Error: {result}"
+            return f"{result}\n".encode()
+
+        # fractions (exact mode) are sent as strings such as "1/3", and so are infinities
+        # and NaN ("inf", "nan", as in plain text), which JSON has no numbers for
+        if type(result) not in (int, float, str) or (type(result) is float and not math.isfinite(result)):
+            result = str(result)
+        return (json.dumps({'id': request_id, 'result': result, 'code': code}, allow_nan=False) + '\n').encode()
+    except ValueError:
+        # an exact result with more digits than Python will convert to a string (quadratic time)
+        return format_response(too_costly, TOO_COSTLY, request_id, is_json)
+
+class CalculatorServer:
+    """A class which serves expression evaluation over TCP or a Unix socket (see the module docstring)."""
+
+    def __init__(self, workers=None, processes=False, batch_size=64, batch_delay=0.001, max_pipeline=1024,
+                 guard=ResourceGuard(), max_slow=64, libraries=(), max_line=1 << 22):
+        """
+        Parameters:
+            workers (int): the size of the pool (default: the number of CPUs)
+            processes (bool): whether to evaluate in processes rather than threads
+            batch_size (int): the most requests evaluated together
+            batch_delay (float): the longest time, in seconds, a partial batch waits for more requests
+            max_pipeline (int): the most unanswered requests read from one connection
+            guard (ResourceGuard): the cost budgets of a request (None runs everything in its batch)
+            max_slow (int): the most costly requests waiting in the slow lane
+            libraries (list of str): program library files each worker takes parsed programs from (see CalculatorLibrary)
+            max_line (int): the longest request line, in bytes (longer ones are answered as invalid)
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_pipeline = max_pipeline
+        self.guard = guard
+        self.max_slow = max_slow
+        self.libraries = list(libraries)
+        self.max_line = max_line
+        self.executor = None
+        self.slow_executor = None
+        self.batcher = None
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Starts listening, on a Unix socket if a path is given, otherwise on TCP.
+
+            Parameters:
+                host (str): the address to listen on
+                port (int): the TCP port (0 picks a free one)
+                path (str): the Unix socket path (optional)
+
+            Returns:
+                server (asyncio.Server): the listening server
+        """
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        # each process maps the libraries itself, sharing their pages with the others
+        initializer = None
+        if self.libraries:
+            from CalculatorLibrary import install_libraries
+            install_libraries(self.libraries)
+            initializer = install_libraries
+
+        # threads share one program cache, processes evaluate in parallel;
+        # the slow lane is one more worker of the same kind
+        if self.processes:
+            import multiprocessing
+            # spawned (not forked) workers don't inherit the sockets of open connections
+            context = multiprocessing.get_context('spawn')
+            self.executor = ProcessPoolExecutor(self.workers, context, initializer, (self.libraries,))
+            if self.guard is not None:
+                self.slow_executor = ProcessPoolExecutor(1, context, initializer, (self.libraries,))
+        else:
+            self.executor = ThreadPoolExecutor(self.workers)
+            if self.guard is not None:
+                self.slow_executor = ThreadPoolExecutor(1)
+        self.batcher = Batcher(self.executor, self.batch_size, self.batch_delay, self.workers * 2,
+                               self.guard, self.slow_executor, self.max_slow)
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=self.max_line)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.max_line)
+        return self.server
+
+    async def close(self):
+        """Stops listening and shuts down the pool."""
+
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for executor in (self.executor, self.slow_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """Answers the requests of one connection, in the order they were sent."""
+
+        # answers waiting to be written; a full queue stops reading from this client
+        answers = asyncio.Queue(self.max_pipeline)
+        writing = asyncio.ensure_future(self.write_answers(answers, writer))
+
+        try:
+            while not writing.done():
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as error:
+                    # the last line, without a newline
+                    line = error.partial
+                except asyncio.LimitOverrunError as error:
+                    await answers.put(await self.skip_line(reader, error.consumed))
+                    continue
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                await answers.put(await self.submit(line))
+        except ConnectionError:
+            pass
+        finally:
+            await answers.put(None)
+            try:
+                await writing
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def skip_line(self, reader, consumed):
+        """
+        Reads past a request line longer than max_line, without keeping it.
+
+            Parameters:
+                reader (asyncio.StreamReader): the connection
+                consumed (int): the number of bytes of the line already buffered
+
+            Returns:
+                answer (tuple): an INVALID answer, the request id (None) and whether the line was JSON
+        """
+
+        is_json = (await reader.readexactly(consumed)).lstrip().startswith(b'{')
+        while True:
+            try:
+                await reader.readuntil(b'\n')
+                break
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)
+            except asyncio.IncompleteReadError:
+                break
+
+        future = asyncio.get_running_loop().create_future()
+        future.set_result((f"request too long: over {self.max_line} bytes", INVALID))
+        return future, None, is_json
+
+    async def submit(self, line):
+        """
+        Starts evaluating one request line.
+
+            Parameters:
+                line (bytes): the request, without its newline
+
+            Returns:
+                answer (tuple): the future of the (result, error code) tuple,
+                                the request id and whether it was JSON
+        """
+
+        try:
+            request, request_id, is_json = parse_request(line)
+        except Exception as error:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result((str(error), INVALID))
+            # answer in the format the request came in
+            return future, None, line.startswith(b'{')
+        return await self.batcher.submit(request), request_id, is_json
+
+    async def write_answers(self, answers, writer):
+        """Writes each answer as soon as it and all the answers before it are ready."""
+
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                break
+            future, request_id, is_json = answer
+            try:
+                result, code = await future
+            except Exception as error:
+                result, code = str(error), INVALID
+            writer.write(format_response(result, code, request_id, is_json))
+            # only wait for the socket when there is nothing else ready to write
+            if answers.empty():
+                await writer.drain()
+        await writer.drain()
+
+def main(argv=None):
+    """The main method. Runs the server until interrupted."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve calculator evaluation over TCP or a Unix socket.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="size of the pool (default: CPUs)")
+    parser.add_argument('--processes', action='store_true', help="evaluate in processes instead of threads")
+    parser.add_argument('--batch-size', type=int, default=64, help="most requests evaluated together")
+    parser.add_argument('--batch-delay', type=float, default=0.001, help="seconds a partial batch waits")
+    parser.add_argument('--max-pipeline', type=int, default=1024, help="most unanswered requests per connection")
+    parser.add_argument('--max-bits', type=int, default=1 << 22, help="largest number a request may build, in bits")
+    parser.add_argument('--max-work', type=float, default=5e7,
+                        help="most estimated word operations of a request (roughly 20 ns each)")
+    parser.add_argument('--max-nodes', type=int, default=100000, help="most operands and operators in a request")
+    parser.add_argument('--max-slow', type=int, default=64, help="most costly requests waiting in the slow lane")
+    parser.add_argument('--no-guard', action='store_true', help="don't estimate costs, run every request in its batch")
+    parser.add_argument('--max-line', type=int, default=1 << 22,
+                        help="longest request line, in bytes (default 4 MiB, longer ones are answered as invalid)")
+    parser.add_argument('--library', action='append', default=[], metavar='PATH',
+                        help="take parsed programs from a program library (see CalculatorLibrary) before parsing "
+                             "(may be repeated)")
+    args = parser.parse_args(argv)
+
+    guard = None if args.no_guard else ResourceGuard(args.max_nodes, max_bits=args.max_bits, max_work=args.max_work)
+
+    async def serve():
+        server = CalculatorServer(args.workers, args.processes, args.batch_size, args.batch_delay,
+                                  args.max_pipeline, guard, args.max_slow, args.library, args.max_line)
+        listening = await server.start(args.host, args.port, args.unix)
+        print("listening on", args.unix or ', '.join(str(s.getsockname()) for s in listening.sockets),
+              file=sys.stderr)
+        try:
+            await listening.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
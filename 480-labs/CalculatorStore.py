@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+A persistent result cache: results of earlier runs kept in a local SQLite file,
+so a repeated run only parses and evaluates expressions it hasn't seen before.
+
+Results are keyed by the normalized expression, the numeric mode, and the version of
+that mode's semantics (see versions), and include error outcomes. The file is opened
+in WAL mode, so many processes can read it while one writes; each thread uses its
+own connection. The least recently used results are evicted beyond max_entries.
+When results are used is recorded a batch at a time, so readers seldom write.
+
+    store = ResultStore('results.db')
+    results = list(evaluate_cached(expressions, store))
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from itertools import repeat
+from CalculatorEngine import Evaluate, evaluate_chunk, iter_chunks, two_decimals_pattern
+
+"""The version of each numeric mode's results: bump one when its semantics change, to ignore stored results."""
+versions = {'float': 1, 'exact': 1}
+
+"""Matches a number literal, with its integer digits, decimal point and fraction digits as groups
+   (or a named variable, which is left as it is)."""
+number_pattern = re.compile(r'\[[A-Za-z_][A-Za-z0-9_]*\]|(?=[0-9]|\.[0-9])([0-9]*)(\.?)([0-9]*)')
+
+def normalize(expression):
+    """
+    Returns the key of an expression: without surrounding whitespace, and with each number
+    written the same way ('007.50' is '7.5'), so expressions with the same result share a key.
+
+        Parameters:
+            expression (str): the mathematical expression in infix notation
+
+        Returns:
+            key (str): the normalized expression
+    """
+
+    expression = expression.strip()
+
+    # dropping zeros could join two decimal points into one number, so leave those alone
+    if two_decimals_pattern.search(expression):
+        return expression
+
+    def number(match):
+        whole, point, fraction = match.groups()
+        if whole is None:
+            return match.group()
+        whole = whole.lstrip('0') or '0'
+        fraction = fraction.rstrip('0')
+        return whole + '.' + fraction if fraction else whole
+
+    return number_pattern.sub(number, expression)
+
+def encode(result):
+    """Returns the kind and text of a result, for storing (integers are hexadecimal, so any size fits)."""
+
+    if type(result) is int:
+        return 'int', hex(result)
+    if type(result) is float:
+        return 'float', repr(result)
+    if type(result) is str:
+        return 'str', result
+    return 'fraction', f"{hex(result.numerator)}/{hex(result.denominator)}"
+
+def decode(kind, value):
+    """Returns the result stored as a kind and text (see encode)."""
+
+    if kind == 'int':
+        return int(value, 16)
+    if kind == 'float':
+        return float(value)
+    if kind == 'str':
+        return value
+    from fractions import Fraction
+    numerator, denominator = value.split('/')
+    return Fraction(int(numerator, 16), int(denominator, 16))
+
+class ResultStore:
+    """A class which keeps evaluation results in a SQLite file (see the module docstring).
+       It is safe to share between threads, and the file between processes."""
+
+    def __init__(self, path, max_entries=1000000, track_use=True, touch_batch=4096):
+        """
+        Parameters:
+            path (str): the SQLite file (created if it doesn't exist)
+            max_entries (int): the most results kept (None for no limit)
+            track_use (bool): whether to record when results are used, for eviction (if not,
+                              reading never writes, and results are evicted oldest stored first)
+            touch_batch (int): the number of uses to collect before recording them in one write
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+        self.track_use = track_use
+        self.touch_batch = touch_batch
+        # the time each result found was last used, keyed by (expression, mode), not yet written
+        self._touches = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # an estimate of the number of results, so eviction doesn't count them after every write
+        self._size = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        with self.connection() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS results (
+                                      expression TEXT NOT NULL,
+                                      mode TEXT NOT NULL,
+                                      version INTEGER NOT NULL,
+                                      kind TEXT NOT NULL,
+                                      value TEXT NOT NULL,
+                                      code INTEGER NOT NULL,
+                                      used REAL NOT NULL,
+                                      PRIMARY KEY (expression, mode, version)
+                                  ) WITHOUT ROWID''')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+
+    def connection(self):
+        """Returns this thread's connection to the file, opening it the first time."""
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            # readers don't block the writer (or each other)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """Records any uses not yet written, then closes this thread's connection."""
+
+        self.flush()
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def get_many(self, expressions, mode='float', touch=None):
+        """
+        Looks up the stored results of many expressions at once.
+
+            Parameters:
+                expressions (iterable of str): the normalized expressions (see normalize)
+                mode (str): the numeric mode (see numeric_modes)
+                touch (bool): whether to mark the results found as recently used (default track_use)
+
+            Returns:
+                results (dict): a (result, error code) tuple for each expression found
+        """
+
+        expressions = list(dict.fromkeys(expressions))
+        connection = self.connection()
+        results = {}
+
+        # SQLite limits the number of parameters of a statement
+        for chunk in iter_chunks(expressions, 500):
+            rows = connection.execute(f'''SELECT expression, kind, value, code FROM results
+                                          WHERE mode = ? AND version = ?
+                                          AND expression IN ({",".join("?" * len(chunk))})''',
+                                      [mode, versions[mode], *chunk])
+            for expression, kind, value, code in rows:
+                results[expression] = (decode(kind, value), code)
+
+        if touch is None:
+            touch = self.track_use
+        now = time.time()
+        with self._lock:
+            self.hits += len(results)
+            self.misses += len(expressions) - len(results)
+            if touch:
+                self._touches.update(((expression, mode), now) for expression in results)
+            full = len(self._touches) >= self.touch_batch
+
+        if full:
+            self.flush()
+        return results
+
+    def flush(self):
+        """Records the uses of results collected by get_many, in one write."""
+
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if not touches:
+            return
+        connection = self.connection()
+        with connection:
+            connection.executemany('UPDATE results SET used = ? WHERE expression = ? AND mode = ? AND version = ?',
+                                   [(used, expression, mode, versions[mode])
+                                    for (expression, mode), used in touches.items()])
+
+    def put_many(self, results, mode='float'):
+        """
+        Stores many results at once, then evicts the least recently used if there are too many.
+
+            Parameters:
+                results (iterable): (normalized expression, (result, error code)) tuples
+                mode (str): the numeric mode (see numeric_modes)
+        """
+
+        # uses not yet written would be lost when eviction picks the oldest
+        self.flush()
+        now = time.time()
+        rows = [(expression, mode, versions[mode], *encode(result), code, now)
+                for expression, (result, code) in results]
+        connection = self.connection()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        if rows:
+            with self._lock:
+                self._size = (len(self) if self._size is None else self._size) + len(rows)
+            if self.max_entries is not None and self._size > self.max_entries:
+                self.evict()
+
+    def get(self, expression, mode='float'):
+        """Returns the stored (result, error code) of one expression, or None."""
+
+        expression = normalize(expression)
+        return self.get_many([expression], mode).get(expression)
+
+    def put(self, expression, result, code, mode='float'):
+        """Stores the result and error code of one expression."""
+
+        self.put_many([(normalize(expression), (result, code))], mode)
+
+    def __len__(self):
+        return self.connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def evict(self):
+        """Removes the least recently used results beyond max_entries (down to 90% of it, so it doesn't run every time)."""
+
+        if self.max_entries is None:
+            return
+        count = self._size = len(self)
+        if count <= self.max_entries:
+            return
+
+        remove = count - int(self.max_entries * 0.9)
+        connection = self.connection()
+        with connection:
+            # many results share a time (a chunk is stored at once), so remove exactly that many rows
+            removed = connection.execute('''DELETE FROM results WHERE (expression, mode, version) IN
+                                              (SELECT expression, mode, version FROM results
+                                               ORDER BY used LIMIT ?)''', (remove,)).rowcount
+        with self._lock:
+            self.evictions += removed
+            self._size = count - removed
+
+    def clear(self):
+        """Removes every stored result."""
+
+        with self._lock:
+            self._touches.clear()
+        connection = self.connection()
+        with connection:
+            connection.execute('DELETE FROM results')
+        self._size = 0
+
+    def stats(self):
+        """Returns a dictionary of the store counters."""
+
+        with self._lock:
+            return {'size': len(self), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+def evaluate_cached(expressions, store, workers=None, chunksize=1024, mode='float'):
+    """
+    Evaluates many infix expressions, taking each result from the store if it is there,
+    and storing the results of the rest. Each chunk of expressions is looked up in one query.
+
+        Parameters:
+            expressions (iterable of str): the mathematical expressions in infix notation
+            store (ResultStore): the persistent results
+            workers (int): the number of processes to evaluate misses with (None or 1 evaluates serially)
+            chunksize (int): the number of expressions looked up (and sent to a process) at a time
+            mode (str): the numeric mode (see numeric_modes)
+
+        Yields:
+            result (tuple): see Evaluate.evaluate_many
+    """
+
+    executor = None
+    if workers is not None and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        for chunk in iter_chunks(expressions, chunksize):
+            keys = [normalize(expression) for expression in chunk]
+            known = store.get_many(keys, mode)
+
+            # evaluate each missing expression once, however often it appears
+            missing = [key for key in dict.fromkeys(keys) if key not in known]
+            if missing:
+                if executor is None:
+                    results = evaluate_chunk(missing, mode)
+                else:
+                    pieces = iter_chunks(missing, max(1, -(-len(missing) // workers)))
+                    results = [result for piece in executor.map(evaluate_chunk, pieces, repeat(mode))
+                               for result in piece]
+                computed = dict(zip(missing, results))
+                store.put_many(computed.items(), mode)
+                known.update(computed)
+
+            for key in keys:
+                yield known[key]
+    finally:
+        if executor is not None:
+            executor.shutdown()
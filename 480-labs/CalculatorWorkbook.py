@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+A workbook of named expressions (cells) which can refer to each other by name,
+written [name] in an internal expression string, like the cells of a spreadsheet:
+
+    book = Workbook()
+    book.set('rate', '0.05')
+    book.set('price', '[cost]*(1+[rate])')
+    book.set('cost', '200')
+    book['price']   # 210
+
+The workbook keeps a dependency graph of which cells read which. Changing a cell only
+marks it stale; recalculate (called by get when needed) evaluates the cells downstream
+of the stale ones, in topological order, and stops following a branch as soon as a
+cell's value comes out unchanged, so the rest of the workbook keeps its values.
+A change which would make a cycle is refused.
+
+A cell whose formula fails holds the error message, and cells which read it hold
+the same message, as in a spreadsheet. A formula can't use the free variable x
+of plotted expressions, since a workbook has no value for it (write [x] to read
+a cell named x).
+"""
+
+import sys
+from CalculatorEngine import Evaluate, free_variables, reference_pattern
+
+class Cell:
+    """A class which holds one cell of a workbook: its formula, compiled program, and value."""
+
+    __slots__ = ('formula', 'program', 'references', 'value', 'error')
+
+    def __init__(self, formula, program, references, error=None):
+        """
+        Parameters:
+            formula (str): the internal expression string
+            program (Program): the formula in compact form (None if it can't be parsed)
+            references (tuple of str): the names of the cells the formula reads
+            error (str): why the formula can't be parsed (None if it can)
+        """
+
+        self.formula = formula
+        self.program = program
+        self.references = references
+        self.value = None
+        self.error = error
+
+class Workbook:
+    """A class which holds named cells that refer to each other (see the module docstring)."""
+
+    def __init__(self, mode='float'):
+        """
+        Parameters:
+            mode (str): the numeric mode of every cell (see numeric_modes)
+        """
+
+        self.mode = mode
+        self.cells = {}
+        # the names of the cells which read each name (including names with no cell yet)
+        self.dependents = {}
+        # cells changed since the last recalculation
+        self.stale = set()
+        # the number of cells evaluated by the last recalculation
+        self.evaluated = 0
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, name):
+        return name in self.cells
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __setitem__(self, name, formula):
+        self.set(name, formula)
+
+    def __delitem__(self, name):
+        self.delete(name)
+
+    def set(self, name, formula):
+        """
+        Sets the formula of a cell (creating it if needed). Its value is updated by the next recalculation.
+
+            Parameters:
+                name (str): the name of the cell (letters, digits and underscores)
+                formula (str or number): the internal expression string, which may read other cells as [name]
+        """
+
+        if not reference_pattern.fullmatch(f'[{name}]'):
+            raise Exception(f"invalid cell name: {name!r}")
+
+        formula = str(formula)
+        # negative numbers are written with '~' in internal expression strings
+        if formula.startswith('-') and formula[1:].replace('.', '', 1).isdigit():
+            formula = '~' + formula[1:]
+
+        # the engine reads a free variable (e.g. x) by the same name as the cell [x], but a workbook
+        # has nothing to supply it with, so it is refused rather than read as that cell
+        bare = [variable for variable in free_variables if variable in reference_pattern.sub('', formula)]
+
+        try:
+            if bare:
+                raise Exception(f"free variable {bare[0]} (a cell is read as [{bare[0]}])")
+            program = Evaluate.convert_to_program(formula, self.mode)
+        except Exception as error:
+            cell = Cell(formula, None, tuple(dict.fromkeys(reference_pattern.findall(formula))), f"Error: {error}")
+        else:
+            cell = Cell(formula, program, tuple(dict.fromkeys(program.names)))
+
+        cycle = self.find_cycle(name, cell.references)
+        if cycle is not None:
+            raise Exception("circular reference: " + ' -> '.join(cycle))
+
+        old = self.cells.get(name)
+        if old is not None:
+            self.unlink(name, old.references)
+            cell.value = old.value
+        for reference in cell.references:
+            self.dependents.setdefault(reference, set()).add(name)
+
+        self.cells[name] = cell
+        self.stale.add(name)
+
+    def set_many(self, formulas):
+        """Sets the formulas of many cells (a dictionary or (name, formula) pairs); they are recalculated together."""
+
+        items = formulas.items() if hasattr(formulas, 'items') else formulas
+        for name, formula in items:
+            self.set(name, formula)
+
+    def delete(self, name):
+        """Removes a cell. Cells which read it get an error at the next recalculation."""
+
+        cell = self.cells.pop(name)
+        self.unlink(name, cell.references)
+        self.stale.discard(name)
+        # its readers have to be recalculated, though it has no cell to start from
+        self.stale.update(self.dependents.get(name, ()))
+
+    def unlink(self, name, references):
+        """Removes the edges from a cell's references to the cell."""
+
+        for reference in references:
+            readers = self.dependents.get(reference)
+            if readers is not None:
+                readers.discard(name)
+                if not readers:
+                    del self.dependents[reference]
+
+    def find_cycle(self, name, references):
+        """
+        Looks for a cycle that giving a cell these references would make.
+
+            Parameters:
+                name (str): the cell being set
+                references (tuple of str): the names its new formula reads
+
+            Returns:
+                cycle (list of str): the names around the cycle, starting and ending with name (None if there is none)
+        """
+
+        references = set(references)
+        if name in references:
+            return [name, name]
+
+        # follow readers downstream from the cell, looking for a cell it is going to read
+        # (a new cell has no readers, so building a workbook doesn't walk it over and over)
+        came_from = {name: None}
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            for reader in self.dependents.get(current, ()):
+                if reader in came_from:
+                    continue
+                came_from[reader] = current
+                if reader in references:
+                    # name reads reader, which reads ... which reads name
+                    path = [name]
+                    while reader is not None:
+                        path.append(reader)
+                        reader = came_from[reader]
+                    return path
+                pending.append(reader)
+        return None
+
+    def affected(self):
+        """Returns the stale cells and every cell downstream of them, in topological order (readers after what they read)."""
+
+        # every cell reachable from a stale one through its readers
+        reached = set()
+        pending = list(self.stale)
+        while pending:
+            current = pending.pop()
+            if current in reached:
+                continue
+            reached.add(current)
+            pending.extend(self.dependents.get(current, ()))
+        reached &= self.cells.keys()
+
+        # Kahn's algorithm, counting only the edges inside the affected cells
+        waiting = {name: sum(1 for reference in self.cells[name].references if reference in reached)
+                   for name in reached}
+        ready = [name for name, count in waiting.items() if count == 0]
+        order = []
+        while ready:
+            current = ready.pop()
+            order.append(current)
+            for reader in self.dependents.get(current, ()):
+                if reader in waiting:
+                    waiting[reader] -= 1
+                    if waiting[reader] == 0:
+                        ready.append(reader)
+        return order
+
+    def evaluate_cell(self, cell):
+        """Returns the value of a cell from the current values of the cells it reads."""
+
+        if cell.program is None:
+            return cell.error
+
+        variables = {}
+        for reference in cell.references:
+            source = self.cells.get(reference)
+            if source is None:
+                return f"Error: unknown cell: {reference}"
+            # errors spread to the cells which read them
+            if type(source.value) == str:
+                return source.value
+            variables[reference] = source.value
+
+        try:
+            return Evaluate.run(cell.program, variables)
+        except Exception as error:
+            return f"Error: {error}"
+
+    def recalculate(self):
+        """
+        Updates the values of the stale cells and of the cells downstream of them,
+        skipping any cell none of whose references changed value.
+
+            Returns:
+                changed (list of str): the names of the cells whose value changed, in the order they were evaluated
+        """
+
+        if not self.stale:
+            return []
+
+        order = self.affected()
+        dirty = set(self.stale)
+        changed = []
+        self.evaluated = 0
+
+        for name in order:
+            if name not in dirty:
+                continue
+            cell = self.cells[name]
+            value = self.evaluate_cell(cell)
+            self.evaluated += 1
+
+            # an unchanged value (of the same type) leaves its readers alone
+            if value == cell.value and type(value) == type(cell.value):
+                continue
+            cell.value = value
+            changed.append(name)
+            dirty.update(self.dependents.get(name, ()))
+
+        self.stale.clear()
+        return changed
+
+    def get(self, name):
+        """Returns the value of a cell (a number, or an error message), recalculating first if anything changed."""
+
+        if self.stale:
+            self.recalculate()
+        return self.cells[name].value
+
+    def values(self):
+        """Returns a dictionary of the value of every cell."""
+
+        if self.stale:
+            self.recalculate()
+        return {name: cell.value for name, cell in self.cells.items()}
+
+    def formulas(self):
+        """Returns a dictionary of the formula of every cell."""
+        return {name: cell.formula for name, cell in self.cells.items()}
+
+    def load(self, lines):
+        """
+        Sets cells from lines of the form 'name = formula' (blank lines and lines starting with # are skipped).
+
+            Parameters:
+                lines (iterable of str): the lines, e.g. an open file
+        """
+
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, equals, formula = line.partition('=')
+            if not equals:
+                raise Exception(f"line {number}: expected 'name = formula'")
+            self.set(name.strip(), formula.strip())
+
+    def dump(self, output=sys.stdout):
+        """Writes every cell as 'name = formula', in the form load reads."""
+
+        for name, formula in self.formulas().items():
+            output.write(f"{name} = {formula}\n")
+
+def main(argv=None):
+    """The main method. Loads workbooks and prints the value of every cell."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate a workbook of named expressions ('name = formula' lines, "
+                                                 "where a formula reads another cell as [name]).")
+    parser.add_argument('files', nargs='+', help="workbook files, loaded in order ('-' for standard input)")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=FORMULA',
+                        help="change a cell after loading (may be repeated)")
+    parser.add_argument('--exact', action='store_true', help="keep integers and fractions exact")
+    args = parser.parse_args(argv)
+
+    book = Workbook('exact' if args.exact else 'float')
+    try:
+        for name in args.files:
+            if name == '-':
+                book.load(sys.stdin)
+            else:
+                with open(name) as file:
+                    book.load(file)
+        book.load(args.set)
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(1)
+
+    for name, value in book.values().items():
+        print(f"{name} = {value}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that exact mode gives whole results as ints, whichever way an expression is evaluated.
+
+    python -m unittest test_exact_mode
+"""
+
+import json
+import unittest
+from fractions import Fraction
+from CalculatorEngine import Evaluate, Program, NO_ERROR
+
+class ExactResultTest(unittest.TestCase):
+    """Tests of exact mode results (see exact_result)."""
+
+    # expressions whose fraction arithmetic ends in a whole number, with their results
+    whole = {'1.5+1.5': 3, '2*0.5': 1, '(1/3)*3': 1, '0.5^~1': 2, '0.25*8-1': 1}
+
+    def evaluate_all_ways(self, expression):
+        postfix = Evaluate.parse(expression, 'exact')
+        return [Evaluate.evaluate(postfix, None, 'exact'),
+                Evaluate.run(Program.from_postfix(postfix, 'exact')),
+                Evaluate.compile(postfix, 'exact')()]
+
+    def test_whole_results_are_ints(self):
+        for expression, expected in self.whole.items():
+            for result in self.evaluate_all_ways(expression):
+                self.assertIs(type(result), int, expression)
+                self.assertEqual(result, expected, expression)
+
+    def test_fractions_stay_fractions(self):
+        for result in self.evaluate_all_ways('1/3+1/6'):
+            self.assertEqual(result, Fraction(1, 2))
+
+    def test_server_sends_whole_results_as_numbers(self):
+        from CalculatorServer import format_response
+        answer = json.loads(format_response(Evaluate.run(Evaluate.convert_to_program('1.5+1.5', 'exact')),
+                                            NO_ERROR, 1, True))
+        self.assertEqual(answer['result'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the engine imports within its time budget, without loading tkinter,
+so command line and server processes start quickly.
+
+    python -m unittest test_import_time
+"""
+
+import os
+import unittest
+from Calculator import IMPORT_TIME_BUDGET, measure_import_time
+
+class ImportTimeTest(unittest.TestCase):
+    """Tests of the engine's import time (see Calculator.check_import_time)."""
+
+    @classmethod
+    def setUpClass(cls):
+        # time the import, not compiling the source (e.g. when PYTHONDONTWRITEBYTECODE is set)
+        import compileall
+        compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels=0, quiet=1)
+
+    def test_engine_within_budget(self):
+        # against the standard library imports timed in the same processes, so a slow machine doesn't fail it
+        milliseconds, baseline_milliseconds, loaded_tkinter = measure_import_time('CalculatorEngine')
+        self.assertLessEqual(milliseconds, IMPORT_TIME_BUDGET * baseline_milliseconds,
+                             f"importing CalculatorEngine took {milliseconds:.1f} ms "
+                             f"after {baseline_milliseconds:.1f} ms of standard library imports")
+        self.assertFalse(loaded_tkinter, "importing CalculatorEngine loaded tkinter")
+
+    def test_calculator_doesnt_load_tkinter(self):
+        # the GUI is only loaded when the window is opened
+        _, _, loaded_tkinter = measure_import_time('Calculator')
+        self.assertFalse(loaded_tkinter, "importing Calculator loaded tkinter")
+
+if __name__ == '__main__':
+    unittest.main()